@@ -3,7 +3,7 @@ import tskit_arg_visualizer as argviz
 
 ts = tszip.load("v1-beta1_2023-02-21.pp.md.bpshift.ts.dated.il.tsz")
 
-d3arg = argviz.D3ARG.from_ts(ts, progress=True)
+d3arg = argviz.D3ARG.from_ts(ts)
 print(f"Loaded {ts.num_nodes} nodes, with {ts.num_samples} samples")
 
 import tskit
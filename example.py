@@ -19,7 +19,7 @@ ts = msprime.sim_mutations(ts, rate=1e-7, random_seed=4321)
 print(ts)
 #print(ts.tables.mutations)
 
-d3arg = tskit_arg_visualizer.D3ARG.from_ts(ts=ts, progress=True)
+d3arg = tskit_arg_visualizer.D3ARG.from_ts(ts=ts)
 
 print(d3arg.draw_node(
     seed_nodes=20,
@@ -0,0 +1,36 @@
+const { test, expect } = require("@playwright/test");
+const { execFileSync } = require("child_process");
+const fs = require("fs");
+const os = require("os");
+const path = require("path");
+
+// Writes a drawing made with assets="inline" using the Python package, which
+// must be installed (as it is in CI) in the interpreter named by $PYTHON.
+function writeInlineDrawing(htmlPath) {
+  const script = [
+    "import sys, msprime, tskit_arg_visualizer as argviz",
+    "ts = msprime.sim_ancestry(samples=4, sequence_length=100, recombination_rate=1e-2,",
+    "    record_full_arg=True, ploidy=1, random_seed=123)",
+    "argviz.D3ARG.from_ts(ts).to_html(sys.argv[1], assets='inline')",
+  ].join("\n");
+  execFileSync(process.env.PYTHON || "python", ["-c", script, htmlPath]);
+}
+
+test("draws with the vendored D3 and no network", async ({ page }) => {
+  const htmlPath = path.join(os.tmpdir(), `argviz-inline-${Date.now()}.html`);
+  writeInlineDrawing(htmlPath);
+
+  const requested = [];
+  await page.route(/^https?:/, (route) => {
+    requested.push(route.request().url());
+    return route.abort();
+  });
+  const errors = [];
+  page.on("pageerror", (error) => errors.push(error.message));
+
+  await page.goto(`file://${htmlPath}`);
+  await expect(page.locator(".d3arg .node").first()).toBeAttached();
+  expect(await page.locator(".d3arg .node").count()).toBeGreaterThan(0);
+  expect(requested).toEqual([]);
+  expect(errors).toEqual([]);
+});
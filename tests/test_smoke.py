@@ -1,5 +1,17 @@
+import dataclasses
+import io
+import json
+import os
+import string
+import subprocess
+import sys
+import warnings
+
 import msprime
+import numpy as np
+import pandas as pd
 import pytest
+import tskit
 
 import tskit_arg_visualizer as argviz
 
@@ -43,6 +55,207 @@ class TestRenderingSmoke:
         assert len(included_nodes) > 0
         assert set(included_nodes).issubset(set(d3arg.nodes["id"]))
 
+    def test_draw_time_window(self, monkeypatch):
+        _, d3arg = _example_d3arg()
+        monkeypatch.setattr(argviz, "display", lambda *_args, **_kwargs: None)
+        times = sorted(set(d3arg.nodes["time"]))
+        window = (times[1], times[-2])
+
+        info = d3arg.draw(
+            y_axis_labels=[0, times[1], times[-1]],
+            show_mutations=True,
+            is_notebook=True,
+            time_window=window,
+        )
+        drawn = d3arg.nodes.loc[d3arg.nodes["id"].isin(info.included.nodes)]
+        assert len(drawn) == len(info.included.nodes)
+        assert drawn["time"].between(*window).all()
+
+    def test_data_embedded_once(self, monkeypatch):
+        _, d3arg = _example_d3arg()
+        shown = []
+        monkeypatch.setattr(argviz, "display", lambda html: shown.append(html.data))
+        d3arg.nodes.loc[0, "label"] = "</script>"
+
+        info = d3arg.draw(is_notebook=True)
+
+        (html,) = shown
+        opening = f'<script type="application/json" id="{info.uid}_source">'
+        start = html.index(opening) + len(opening)
+        source = json.loads(html[start:html.index("</script>", start)])
+        assert source["data"]["nodes"][0]["label"] == "</script>"
+        assert html.count(json.dumps(source["data"]["breakpoints"])) == 1
+        assert "$" + "source" not in html
+
+    def test_data_block_is_strict_json(self, monkeypatch):
+        ts = msprime.sim_mutations(_example_d3arg()[0], rate=5e-2, random_seed=1)
+        tables = ts.dump_tables()
+        tables.mutations.time = np.full(tables.mutations.num_rows, tskit.UNKNOWN_TIME)
+        d3arg = argviz.D3ARG.from_ts(tables.tree_sequence())
+        d3arg.nodes.loc[0, "time"] = np.inf
+        shown = []
+        monkeypatch.setattr(argviz, "display", lambda html: shown.append(html.data))
+
+        def fail(constant):
+            raise ValueError(f"{constant} is not valid JSON")
+
+        for kwargs in ({}, {"columnar_data": True}):
+            info = d3arg.draw(
+                show_mutations=True, ignore_mutation_times=False, condense_mutations=False,
+                is_notebook=True, **kwargs
+            )
+            html = shown[-1]
+            opening = f'<script type="application/json" id="{info.uid}_source">'
+            start = html.index(opening) + len(opening)
+            block = html[start:html.index("</script>", start)]
+            json.loads(block, parse_constant=fail)
+            assert '"\\u0000NaN"' in block and '"\\u0000Infinity"' in block
+
+    def test_notebook_assets_sent_once(self, monkeypatch):
+        _, d3arg = _example_d3arg()
+        shown = []
+        monkeypatch.setattr(argviz, "display", lambda html: shown.append(html.data))
+        argviz.reset_notebook_assets()
+        library = argviz._get_assets().visualizer_library
+
+        d3arg.draw(is_notebook=True)
+        second = d3arg.draw(is_notebook=True).uid
+        assert library in shown[0] and library not in shown[1]
+        assert f"getElementById('{second}')" in shown[1] and f'id="{second}_source"' in shown[1]
+        argviz.reset_notebook_assets()
+        d3arg.draw(is_notebook=True)
+        assert library in shown[2]
+
+        # Colab shows each output in its own frame, so every drawing needs the full code
+        monkeypatch.setattr(argviz, "get_ipython", lambda: type("Shell", (), {})(), raising=False)
+        d3arg.draw(is_notebook=True)
+        d3arg.draw(is_notebook=True)
+        assert all(library in html and "tskit_arg_visualizer_lib" not in html for html in shown[3:])
+
+    def test_draw_to_output_path(self, tmp_path, monkeypatch):
+        _, d3arg = _example_d3arg()
+        monkeypatch.setattr(argviz, "display", None)
+        path = tmp_path / "arg.html"
+
+        info = d3arg.draw(show_mutations=True, output_path=path)
+
+        html = path.read_text(encoding="utf-8")
+        assert html.startswith("<!DOCTYPE html>") and html.endswith("</body></html>")
+        opening = f'<script type="application/json" id="{info.uid}_source">'
+        start = html.index(opening) + len(opening)
+        source = json.loads(html[start:html.index("</script>", start)])
+        assert len(source["data"]["nodes"]) == len(d3arg.nodes)
+        assert not info.is_notebook
+
+    def test_split_template(self):
+        text = "a $$ b $ c ${x} $x $y $$x $ {x} $1 ${d.id}"
+        pieces = argviz._split_template(text)
+        for mapping in ({}, {"x": "X", "y": 1}):
+            assert argviz._fill_template(pieces, mapping) == string.Template(text).safe_substitute(mapping)
+
+    def test_assets_are_cached(self, monkeypatch):
+        _, d3arg = _example_d3arg()
+        d3arg.to_html()
+        assets = argviz._get_assets()
+        monkeypatch.setattr("builtins.open", None)
+        html, _ = d3arg.to_html()
+        assert argviz._get_assets() is assets
+        assert assets.visualizer_css in html
+        monkeypatch.undo()
+        argviz.reload_assets()
+        assert argviz._get_assets() is not assets
+        assert argviz._get_assets() == assets
+
+    def test_to_html(self, tmp_path, monkeypatch):
+        _, d3arg = _example_d3arg()
+
+        def fail(*_args, **_kwargs):
+            raise AssertionError("to_html should not display or open anything")
+
+        monkeypatch.setattr(argviz, "display", fail)
+        monkeypatch.setattr(argviz.webbrowser, "open", fail)
+        monkeypatch.setattr(argviz.tempfile, "NamedTemporaryFile", fail)
+
+        html, info = d3arg.to_html(width=320, show_mutations=True)
+        assert html.startswith("<!DOCTYPE html>") and f'id="{info.uid}"' in html
+        assert len(info.included.nodes) == len(d3arg.nodes)
+        assert not info.is_notebook
+
+        path = tmp_path / "node.html"
+        html, info = d3arg.node_to_html(seed_nodes=d3arg.sample_order[0], path=path)
+        assert html is None
+        assert f'id="{info.uid}"' in path.read_text(encoding="utf-8")
+
+        html, info = d3arg.genome_bar_to_html(show_mutations=True)
+        assert f"id='{info.uid}'" in html
+        assert "True" not in html[html.index("var graph"):]
+
+    def test_inline_assets(self, monkeypatch):
+        _, d3arg = _example_d3arg()
+        with pytest.raises(ValueError, match="assets"):
+            d3arg.to_html(assets="local")
+
+        # The drawing embeds the packaged copy of D3 and loads nothing from a CDN
+        vendored = os.path.join(os.path.dirname(argviz.__file__), "vendor", "d3.v7.min.js")
+        with open(vendored, encoding="utf-8") as f:
+            assert f.read().startswith("// https://d3js.org v7.")
+        assert os.path.exists(os.path.join(os.path.dirname(vendored), "LICENSE-d3"))
+        for html, _ in (d3arg.to_html(assets="inline"), d3arg.genome_bar_to_html(assets="inline")):
+            assert html.count("// https://d3js.org v7.") == 1
+            assert html.count("tskit_arg_visualizer_d3 === 'undefined'") == 1
+            assert "<script src=" not in html
+
+        monkeypatch.setattr(argviz, "_assets", dataclasses.replace(argviz._get_assets(), d3_js=None))
+        with pytest.raises(ValueError, match="vendored"):
+            d3arg.to_html(assets="inline")
+
+    @pytest.mark.parametrize("from_json", [False, True])
+    def test_records_match_rows(self, from_json):
+        ts = msprime.sim_mutations(_example_d3arg()[0], rate=5e-2, random_seed=1)
+        d3arg = argviz.D3ARG.from_ts(ts)
+        d3arg.nodes.loc[0, "time"] = np.inf
+        d3arg.nodes.loc[1, "label"] = "é\"<"
+        kwargs = dict(show_mutations=True, condense_mutations=False, ignore_mutation_times=False)
+        if from_json:
+            d3arg.nodes.loc[0, "time"] = 0
+            d3arg = argviz.D3ARG.from_json(json.loads(json.dumps(d3arg._prepare_json(
+                "full", d3arg.nodes, d3arg.edges, d3arg.mutations, d3arg.breakpoints, **kwargs
+            ))))
+            d3arg.nodes.loc[2, "x_pos_01"] = -1
+            kwargs["ignore_mutation_times"] = True
+        tables = d3arg.nodes, d3arg.edges, d3arg.mutations, d3arg.breakpoints
+        rows = d3arg._prepare_json("full", *tables, **kwargs)
+        records = d3arg._prepare_json("full", *tables, as_records=True, **kwargs)
+        assert argviz._dumps_json(records) == json.dumps(argviz._finite_json(rows))
+        assert "".join(argviz._iter_json(records, chunk_rows=3)) == json.dumps(argviz._finite_json(rows))
+
+    def test_columnar_data(self, monkeypatch):
+        _, d3arg = _example_d3arg()
+        monkeypatch.setattr(argviz, "display", lambda *_args, **_kwargs: None)
+        kwargs = dict(show_mutations=True, condense_mutations=False)
+        rows = d3arg._prepare_json("full", d3arg.nodes, d3arg.edges, d3arg.mutations, d3arg.breakpoints, **kwargs)
+        cols = d3arg._prepare_json(
+            "full", d3arg.nodes, d3arg.edges, d3arg.mutations, d3arg.breakpoints, columnar_data=True, **kwargs
+        )
+        for table in ("nodes", "links", "mutations", "breakpoints"):
+            expected = rows["data"][table]
+            columnar = cols["data"][table]
+            assert columnar["length"] == len(expected)
+            rebuilt = [{} for _ in expected]
+            for field, column in columnar["columns"].items():
+                index = range(len(expected))
+                if isinstance(column, dict) and "rows" in column:
+                    index, column = column["rows"], column["values"]
+                if isinstance(column, dict) and "value" in column:
+                    column = [column["value"]] * len(index)
+                elif isinstance(column, dict):
+                    column = [column["dict"][code] for code in column["codes"]]
+                for i, value in zip(index, column):
+                    rebuilt[i][field] = value
+            assert json.dumps(rebuilt, sort_keys=True) == json.dumps(expected, sort_keys=True)
+        info = d3arg.draw(is_notebook=True, columnar_data=True, coordinate_precision=1)
+        assert len(info.included.nodes) == len(d3arg.nodes)
+
     def test_draw_nodes_returns_drawinfo_without_opening_browser(self, monkeypatch):
         _, d3arg = _example_d3arg()
 
@@ -98,6 +311,476 @@ class TestGraphSubsetSmoke:
         assert set(subset.edges["target"]).issubset(node_ids)
         assert set(subset.mutations["edge"]).issubset(set(subset.edges["id"]))
 
+    @pytest.mark.parametrize("depth", [0, 2, [3, 1], [0, 4]])
+    def test_subset_graph_matches_per_seed_search(self, depth):
+        _, d3arg = _example_d3arg()
+        edges = d3arg.edges
+        seeds = d3arg.nodes["id"].sample(6, random_state=1).tolist()
+        depths = [depth, depth] if isinstance(depth, int) else depth
+
+        nodes, rows, last_links = set(seeds), set(), []
+        for end, other, max_depth in (("target", "source", depths[0]), ("source", "target", depths[1])):
+            for seed in seeds:
+                level = {seed}
+                for _ in range(max_depth):
+                    links = edges.loc[edges[end].isin(level)]
+                    rows.update(links.index)
+                    level = set(links[other])
+                    nodes.update(level)
+                last_links.append((edges.loc[edges[end].isin(level)], other))
+        for links, other in last_links:
+            rows.update(links.index[links[other].isin(nodes)])
+
+        subset = d3arg.subset_graph(seed_nodes=seeds, depth=depth)
+        assert set(subset.nodes["id"]) == nodes
+        assert sorted(subset.edges["id"]) == sorted(edges.loc[list(rows), "id"])
+        left_out = edges.drop(index=list(rows))
+        for node in subset.nodes.itertuples():
+            assert node.not_included_children == (left_out["source"] == node.id).sum()
+            assert node.not_included_parents == (left_out["target"] == node.id).sum()
+
+    def test_subset_graph_with_edges_to_missing_nodes(self):
+        ts = msprime.sim_mutations(_example_d3arg()[0], rate=5e-2, random_seed=1)
+        d3arg = argviz.D3ARG.from_ts(ts)
+        arg_json = json.loads(json.dumps(d3arg._prepare_json(
+            "full", d3arg.nodes, d3arg.edges, d3arg.mutations, d3arg.breakpoints,
+            show_mutations=True, condense_mutations=False,
+        )))
+        root = max(node["id"] for node in arg_json["data"]["nodes"])
+        arg_json["data"]["nodes"] = [node for node in arg_json["data"]["nodes"] if node["id"] != root]
+        d3arg = argviz.D3ARG.from_json(arg_json)
+
+        subset = d3arg.subset_graph(seed_nodes=[d3arg.sample_order[0]], depth=10)
+        assert root not in set(subset.nodes["id"])
+        assert root in set(subset.edges["source"])
+        left_out = d3arg.edges.loc[~d3arg.edges["id"].isin(subset.edges["id"])]
+        for node in subset.nodes.itertuples():
+            assert node.not_included_children == (left_out["source"] == node.id).sum()
+            assert node.not_included_parents == (left_out["target"] == node.id).sum()
+
+
+class TestConversion:
+    def test_links_combine_tskit_edges(self):
+        ts, d3arg = _example_d3arg()
+        lookup = np.arange(ts.num_nodes)
+        lookup[np.where(ts.nodes_flags & msprime.NODE_IS_RE_EVENT)[0][1::2]] -= 1
+        expected = {}  # (plotted parent, original child) -> intervals, in edge table order
+        for edge in ts.edges():
+            key = (lookup[edge.parent], edge.child)
+            expected.setdefault(key, []).append(f"{edge.left}-{edge.right}")
+
+        assert list(d3arg.edges["id"]) == list(range(len(expected)))
+        assert list(d3arg.edges["source"]) == [parent for parent, _ in expected]
+        assert list(d3arg.edges["target"]) == [lookup[child] for _, child in expected]
+        assert list(d3arg.edges["bounds"]) == [" ".join(b) for b in expected.values()]
+        assert d3arg.edges["region_fraction"].sum() == pytest.approx(
+            np.sum(ts.edges_right - ts.edges_left) / ts.sequence_length
+        )
+
+
+    def test_node_lists_and_labels(self):
+        ts, d3arg = _example_d3arg()
+        edges = d3arg.edges
+        for node in d3arg.nodes.itertuples():
+            assert node.child_of == sorted(set(edges.loc[edges["target"] == node.id, "source"]))
+            assert node.parent_of == sorted(set(edges.loc[edges["source"] == node.id, "target"]))
+            if node.ts_flags == msprime.NODE_IS_RE_EVENT:
+                assert node.label == f"{node.id}/{node.id + 1}"
+            else:
+                assert node.label == str(node.id)
+        assert (d3arg.nodes["fill"] == d3arg.default_node_style["fill"]).all()
+
+    def test_progress_is_deprecated(self):
+        ts, d3arg = _example_d3arg()
+        with pytest.warns(DeprecationWarning, match="progress"):
+            with_progress = argviz.D3ARG.from_ts(ts, progress=True)
+        assert with_progress.nodes.equals(d3arg.nodes)
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            argviz.D3ARG.from_ts(ts, progress=False)
+
+    def test_mutation_states_and_seeded_unknown_times(self):
+        ts = msprime.sim_ancestry(
+            samples=4,
+            sequence_length=1000,
+            recombination_rate=1e-3,
+            record_full_arg=True,
+            ploidy=1,
+            random_seed=1,
+        )
+        ts = msprime.sim_mutations(ts, rate=5e-3, random_seed=1)
+        tables = ts.dump_tables()
+        tables.mutations.time = np.full(ts.num_mutations, tskit.UNKNOWN_TIME)
+        ts = tables.tree_sequence()
+        first = argviz.D3ARG.from_ts(ts, random_seed=42)
+        second = argviz.D3ARG.from_ts(ts, random_seed=42)
+        assert first.mutations["plot_time"].equals(second.mutations["plot_time"])
+
+        muts = first.mutations
+        links = first.edges.set_index("id").loc[muts["edge"]]
+        assert np.all(muts["plot_time"].to_numpy() >= links["target_time"].to_numpy())
+        assert np.all(muts["plot_time"].to_numpy() <= links["source_time"].to_numpy())
+        expected = [
+            ts.site(m.site).ancestral_state if m.parent == tskit.NULL else ts.mutation(m.parent).derived_state
+            for m in ts.mutations() if m.edge != tskit.NULL
+        ]
+        assert list(muts["inherited"]) == expected
+
+
+    def test_minlex_postorder_matches_tskit(self):
+        ts = msprime.sim_ancestry(
+            samples=[msprime.SampleSet(6), msprime.SampleSet(3, time=20)],
+            population_size=50,
+            sequence_length=1000,
+            recombination_rate=1e-4,
+            random_seed=5,
+        )
+        ts = ts.decapitate(40)  # multiple roots
+        for tree in ts.trees():
+            expected = list(tree.nodes(order="minlex_postorder"))
+            assert argviz._minlex_postorder(tree).tolist() == expected
+
+    def test_sample_order_skips_unattached_samples(self):
+        ts, _ = _example_d3arg()
+        tables = ts.dump_tables()
+        isolated = tables.nodes.add_row(flags=tskit.NODE_IS_SAMPLE, time=0)
+        ts = tables.tree_sequence()
+        assert isolated in argviz.D3ARG.from_ts(ts).sample_order
+        assert isolated not in argviz.D3ARG.from_ts(ts, ignore_unattached_nodes=True).sample_order
+
+
+    def test_breakpoints_table(self):
+        ts, d3arg = _example_d3arg()
+        bps = d3arg.breakpoints
+        assert list(bps["start"]) == list(ts.breakpoints())[:-1]
+        assert list(bps["stop"]) == list(ts.breakpoints())[1:]
+        assert bps["width_01"].sum() == pytest.approx(1)
+        d3arg.set_breakpoint_fills({0: "red"})
+        assert list(d3arg.breakpoints["fill"].iloc[:2]) == ["red", "#053e4e"]
+
+
+    def test_interval_restricted_conversion(self):
+        ts = msprime.sim_ancestry(
+            samples=5,
+            sequence_length=1000,
+            recombination_rate=1e-3,
+            record_full_arg=True,
+            ploidy=1,
+            random_seed=3,
+        )
+        ts = msprime.sim_mutations(ts, rate=5e-3, random_seed=3)
+        intervals = [[600, 800], [100, 300]]
+        d3arg = argviz.D3ARG.from_ts(ts, interval=intervals)
+        reference = argviz.D3ARG.from_ts(
+            ts.keep_intervals(sorted(intervals), simplify=False), ignore_unattached_nodes=True
+        )
+        assert list(d3arg.edges["bounds"]) == list(reference.edges["bounds"])
+        assert d3arg.edges["region_fraction"].to_numpy() * 400 == pytest.approx(
+            reference.edges["region_fraction"].to_numpy() * ts.sequence_length
+        )
+        assert set(d3arg.nodes["id"]) == set(reference.nodes["id"]) | set(ts.samples())
+        positions = d3arg.mutations["position"]
+        assert (((positions >= 100) & (positions < 300)) | ((positions >= 600) & (positions < 800))).all()
+        assert d3arg.breakpoints["start"].min() == 100
+        assert d3arg.breakpoints["stop"].max() == 800
+        assert d3arg.breakpoints["width_01"].sum() == pytest.approx(1)
+
+    @pytest.mark.parametrize("interval", [[10, 5], [0, 200], [[0, 50], [40, 60]], [1, 2, 3]])
+    def test_bad_interval(self, interval):
+        ts, _ = _example_d3arg()
+        with pytest.raises(ValueError):
+            argviz.D3ARG.from_ts(ts, interval=interval)
+
+    def test_time_window_conversion(self):
+        ts = msprime.sim_mutations(_example_d3arg()[0], rate=5e-2, random_seed=1)
+        full = argviz.D3ARG.from_ts(ts, random_seed=1)
+        t_min, t_max = np.quantile(full.nodes["time"], [0.3, 0.7])
+        d3arg = argviz.D3ARG.from_ts(ts, random_seed=1, time_window=(t_min, t_max))
+        nodes = d3arg.nodes.set_index("id")
+        real = nodes.loc[~nodes["truncated"]]
+        assert set(real.index) == set(full.nodes.loc[full.nodes["time"].between(t_min, t_max), "id"])
+        assert set(nodes.loc[nodes["truncated"], "time"]) <= {t_min, t_max}
+        edges = d3arg.edges
+        for edge in edges.itertuples():
+            # Every link touches one real node, stubs touch exactly one
+            assert (edge.source in real.index) or (edge.target in real.index)
+            assert edge.truncated == ((edge.source not in real.index) or (edge.target not in real.index))
+            original = full.edges.loc[full.edges["id"] == edge.id].iloc[0]
+            assert edge.source_time == min(original.source_time, t_max)
+            assert edge.target_time == max(original.target_time, t_min)
+        assert d3arg.mutations["plot_time"].between(t_min, t_max).all()
+        assert set(d3arg.mutations["edge"]) <= set(edges["id"])
+        assert d3arg.sample_order == [s for s in full.sample_order if s in real.index]
+        assert set(d3arg.children_of(edges["source"])) <= set(nodes.index)
+
+    def test_time_window_open_side(self):
+        ts, full = _example_d3arg()
+        d3arg = argviz.D3ARG.from_ts(ts, time_window=(None, full.nodes["time"].max()))
+        assert not d3arg.edges["truncated"].any()
+        assert len(d3arg.nodes) == len(full.nodes)
+        assert d3arg.sample_order == full.sample_order
+
+    def test_conversion_cache(self, tmp_path, monkeypatch):
+        ts = msprime.sim_mutations(_example_d3arg()[0], rate=5e-2, random_seed=1)
+        first = argviz.D3ARG.from_ts(ts, cache_dir=tmp_path, random_seed=1)
+        (entry,) = tmp_path.glob("*/*/meta.json")
+
+        def fail(*args, **kwargs):
+            raise AssertionError("cached conversion should not be recomputed")
+
+        monkeypatch.setattr(argviz.D3ARG, "_convert_edges_table", fail)
+        cached = argviz.D3ARG.from_ts(ts, cache_dir=tmp_path, random_seed=1)
+        for table in ("nodes", "edges", "mutations", "breakpoints"):
+            pd.testing.assert_frame_equal(getattr(first, table), getattr(cached, table))
+        assert cached.sample_order == first.sample_order
+        with pytest.raises(AssertionError):
+            argviz.D3ARG.from_ts(ts, cache_dir=tmp_path, ignore_unattached_nodes=True)
+        monkeypatch.setattr(argviz, "_package_version", lambda: "0.0.0")
+        with pytest.raises(AssertionError):  # written by another version of the package
+            argviz.D3ARG.from_ts(ts, cache_dir=tmp_path, random_seed=1)
+        monkeypatch.undo()
+
+        argviz.D3ARG.clear_cache(tmp_path, ts)
+        assert not entry.exists()
+
+    def test_conversion_cache_eviction(self, tmp_path):
+        ts, _ = _example_d3arg()
+        argviz.D3ARG.from_ts(ts, cache_dir=tmp_path)
+        argviz.D3ARG.from_ts(ts, cache_dir=tmp_path, ignore_unattached_nodes=True)
+        assert len(list(tmp_path.glob("*/*/meta.json"))) == 2
+        argviz.D3ARG.from_ts(ts, cache_dir=tmp_path, time_window=(0, 1), cache_size=1)
+        assert len(list(tmp_path.glob("*/*/meta.json"))) == 1  # only the newest entry is kept
+        argviz.D3ARG.clear_cache(tmp_path)
+        assert list(tmp_path.iterdir()) == []
+
+    @pytest.mark.parametrize("time_window", [(5, 1), (1, 2, 3), (np.nan, 1)])
+    def test_bad_time_window(self, time_window):
+        ts, _ = _example_d3arg()
+        with pytest.raises(ValueError):
+            argviz.D3ARG.from_ts(ts, time_window=time_window)
+
+
+class TestAdjacency:
+    def test_parents_and_children_match_edges(self):
+        _, d3arg = _example_d3arg()
+        edges = d3arg.edges
+        for u in d3arg.nodes["id"]:
+            assert list(d3arg.parents_of(u)) == sorted(set(edges.loc[edges["target"] == u, "source"]))
+            assert list(d3arg.children_of(u)) == sorted(set(edges.loc[edges["source"] == u, "target"]))
+        ids = d3arg.nodes["id"].to_numpy()[:5]
+        assert list(d3arg.parents_of(ids)) == sorted(set(edges.loc[edges["target"].isin(ids), "source"]))
+
+    def test_unknown_node_raises(self):
+        _, d3arg = _example_d3arg()
+        with pytest.raises(ValueError, match="not in the graph"):
+            d3arg.children_of([d3arg.nodes["id"].max() + 1])
+
+
+class TestMergeHierarchy:
+    @staticmethod
+    def _naive_groups(d3arg, zoom):
+        # Merges the groups at the ends of the shortest edges one by one, relabelling every member
+        nodes = d3arg.nodes.set_index("id")
+        label = {u: u for u in nodes.index}
+        members = {u: [u] for u in nodes.index}
+        times = {}
+        edges = d3arg.edges.assign(length=d3arg.edges["source_time"] - d3arg.edges["target_time"])
+        for edge in edges.sort_values("length", kind="stable").itertuples():
+            if len(times) >= zoom:
+                break
+            a, b = label[edge.source], label[edge.target]
+            if (nodes.loc[edge.target, "ts_flags"] & tskit.NODE_IS_SAMPLE) or a == b:
+                continue
+            summary = d3arg.nodes["id"].max() + 1 + len(times)
+            members[summary] = members.pop(a) + members.pop(b)
+            times[summary] = np.mean(nodes.loc[members[summary], "time"])
+            for u in members[summary]:
+                label[u] = summary
+        return [label[u] for u in d3arg.nodes["id"]], {s: times[s] for s in members if s in times}
+
+    @pytest.mark.parametrize("zoom", [1, 4, 10, 1000])
+    def test_matches_naive_merging(self, zoom):
+        _, d3arg = _example_d3arg()
+        ids, times = d3arg._map_node_ids_at_zoom(zoom)
+        expected_ids, expected_times = self._naive_groups(d3arg, zoom)
+        assert ids.tolist() == expected_ids
+        assert times.keys() == expected_times.keys()
+        assert np.allclose(list(times.values()), list(expected_times.values()))
+
+    def test_groups_match_union_find(self):
+        ts = msprime.sim_ancestry(
+            samples=20, sequence_length=1000, recombination_rate=1e-3,
+            record_full_arg=True, ploidy=1, random_seed=7,
+        )
+        hierarchy = argviz.D3ARG.from_ts(ts).merge_hierarchy
+        num_nodes = len(hierarchy.node_ids)
+        for zoom in [0, 1, 2, 5, 17, len(hierarchy.times) // 2, len(hierarchy.times), 10**6]:
+            root = list(range(num_nodes + len(hierarchy.times)))
+
+            def find(g):
+                while root[g] != g:
+                    g = root[g]
+                return g
+
+            for merge in range(min(zoom, len(hierarchy.times))):
+                for g in np.flatnonzero(hierarchy.merged_into == merge).tolist():
+                    root[find(g)] = num_nodes + merge
+            assert hierarchy.groups(zoom).tolist() == [find(i) for i in range(num_nodes)]
+
+    def test_draw_zoom(self, monkeypatch):
+        _, d3arg = _example_d3arg()
+        monkeypatch.setattr(argviz, "display", lambda *_args, **_kwargs: None)
+        hierarchy = d3arg.merge_hierarchy
+        assert d3arg.merge_hierarchy is hierarchy
+
+        info = d3arg.draw(zoom=3, is_notebook=True)
+
+        summary = [u for u in info.included.nodes if u >= hierarchy.first_summary_id]
+        assert 0 < len(summary) <= 3
+        assert len(info.included.nodes) < len(d3arg.nodes)
+        assert set(d3arg.sample_order) <= set(info.included.nodes)
+
+    def test_collapsed_tables(self):
+        ts = msprime.sim_mutations(_example_d3arg()[0], rate=5e-2, random_seed=1)
+        d3arg = argviz.D3ARG.from_ts(ts)
+        nodes, edges, mutations = d3arg._collapse_graph(zoom=3)
+
+        pairs = list(zip(edges["source"], edges["target"]))
+        assert len(set(pairs)) == len(pairs) and all(source != target for source, target in pairs)
+        mapped = dict(zip(d3arg.nodes["id"], d3arg._map_node_ids_at_zoom(3)[0]))
+        merged = d3arg.edges.assign(
+            source=d3arg.edges["source"].map(mapped), target=d3arg.edges["target"].map(mapped)
+        ).query("source != target")
+        assert len(merged) > len(edges)  # some parallel edges were combined
+        for (source, target), parallel in merged.groupby(["source", "target"]):
+            (link,) = edges.loc[(edges["source"] == source) & (edges["target"] == target)].itertuples()
+            assert link.id == parallel["id"].min()
+            assert link.bounds == " ".join(parallel["bounds"])
+            assert np.isclose(link.region_fraction, min(1, parallel["region_fraction"].sum()))
+        for node in nodes.itertuples():
+            assert node.parent_of == sorted(set(edges.loc[edges["source"] == node.id, "target"]))
+            assert node.child_of == sorted(set(edges.loc[edges["target"] == node.id, "source"]))
+        assert set(mutations["edge"]) <= set(edges["id"])
+        on_edge = edges.set_index("id").loc[mutations["edge"]]
+        assert (on_edge["source"].to_numpy() == mutations["source"].to_numpy()).all()
+
+    def test_collapse_levels(self):
+        _, d3arg = _example_d3arg()
+        levels = [0, 2, 5, 1000]
+        nodes, edges = d3arg._collapse_levels(levels)
+
+        assert not nodes["id"].duplicated().any()
+        for level, zoom in enumerate(levels):
+            expected_nodes, expected_edges, _ = d3arg._collapse_graph(zoom=zoom)
+            shown = nodes.loc[(nodes["zoom_from"] <= level) & (level <= nodes["zoom_to"])]
+            assert sorted(shown["id"]) == sorted(expected_nodes["id"])
+            shown = edges.loc[(edges["zoom_from"] <= level) & (level <= edges["zoom_to"])]
+            columns = ["id", "source", "target", "bounds", "region_fraction"]
+            assert sorted(map(tuple, shown[columns].to_numpy().tolist())) == sorted(
+                map(tuple, expected_edges[columns].to_numpy().tolist())
+            )
+            if level + 1 < len(levels):
+                merged = nodes.loc[nodes["zoom_to"] == level, "zoom_into"]
+                next_ids = set(d3arg._collapse_graph(zoom=levels[level + 1])[0]["id"])
+                assert len(merged) > 0 and set(merged) <= next_ids
+        assert (nodes.loc[nodes["zoom_to"] == len(levels) - 1, "zoom_into"] == -1).all()
+
+    def test_draw_zoom_levels(self, capsys):
+        _, d3arg = _example_d3arg()
+        html, info = d3arg.to_html(zoom_levels=[4, 0, 4], show_mutations=True)
+        assert "WARNING" in capsys.readouterr().out
+        assert '"zoom_levels": [0, 4]' in html
+        assert sorted(info.included.nodes) == sorted(d3arg.nodes["id"])
+        with pytest.raises(ValueError, match="zoom_levels"):
+            d3arg.draw(zoom_levels=[-1, 2], is_notebook=True)
+        with pytest.raises(ValueError, match="zoom_levels"):
+            d3arg.draw(zoom=2, zoom_levels=[0, 2], is_notebook=True)
+
+
+class TestSaveLoad:
+    @pytest.mark.parametrize("mmap", [True, False])
+    def test_round_trip(self, tmp_path, mmap):
+        ts = msprime.sim_mutations(_example_d3arg()[0], rate=5e-2, random_seed=1)
+        d3arg = argviz.D3ARG.from_ts(ts, random_seed=1)
+        d3arg.set_breakpoint_fills({0: "red"})
+        d3arg.save(tmp_path / "arg")
+        loaded = argviz.D3ARG.load(tmp_path / "arg", mmap=mmap)
+        for table in ("nodes", "edges", "mutations", "breakpoints"):
+            pd.testing.assert_frame_equal(getattr(d3arg, table), getattr(loaded, table))
+        assert loaded.sample_order == d3arg.sample_order
+        assert loaded.num_samples == d3arg.num_samples
+        assert loaded.default_node_style == d3arg.default_node_style
+        assert loaded.time_units == d3arg.time_units
+
+    def test_changes_are_not_written_back(self, tmp_path):
+        _, d3arg = _example_d3arg()
+        d3arg.save(tmp_path)
+        loaded = argviz.D3ARG.load(tmp_path)
+        loaded.set_node_styles({0: {"size": 1}})
+        loaded.nodes.loc[0, "time"] = -1
+        reloaded = argviz.D3ARG.load(tmp_path)
+        pd.testing.assert_frame_equal(reloaded.nodes, d3arg.nodes)
+
+    def test_from_json_round_trip(self, tmp_path):
+        ts = msprime.sim_mutations(_example_d3arg()[0], rate=5e-2, random_seed=1)
+        d3arg = argviz.D3ARG.from_ts(ts)
+        arg_json = d3arg._prepare_json(
+            plot_type="full",
+            nodes=d3arg.nodes,
+            edges=d3arg.edges,
+            mutations=d3arg.mutations,
+            breakpoints=d3arg.breakpoints,
+            show_mutations=True,
+            condense_mutations=False,
+        )
+        from_json = argviz.D3ARG.from_json(arg_json)
+        from_json.save(tmp_path)
+        loaded = argviz.D3ARG.load(tmp_path, mmap=False)
+        for table in ("nodes", "edges", "mutations", "breakpoints"):
+            pd.testing.assert_frame_equal(getattr(from_json, table), getattr(loaded, table))
+
+
+class TestJSONFile:
+    def _arg_json(self):
+        ts = msprime.sim_mutations(_example_d3arg()[0], rate=5e-2, random_seed=1)
+        d3arg = argviz.D3ARG.from_ts(ts)
+        return d3arg._prepare_json(
+            plot_type="full",
+            nodes=d3arg.nodes,
+            edges=d3arg.edges,
+            mutations=d3arg.mutations,
+            breakpoints=d3arg.breakpoints,
+            show_mutations=True,
+            condense_mutations=False,
+            title="A \"quoted\" title, with [brackets] and {braces}",
+        )
+
+    def test_matches_from_json(self, tmp_path):
+        arg_json = self._arg_json()
+        path = tmp_path / "arg.json"
+        path.write_text(json.dumps(arg_json, indent=1))
+        expected = argviz.D3ARG.from_json(json.loads(path.read_text()))
+        d3arg = argviz.D3ARG.from_json_file(path)
+        for table in ("nodes", "edges", "mutations", "breakpoints"):
+            pd.testing.assert_frame_equal(getattr(expected, table), getattr(d3arg, table))
+        assert d3arg.sample_order == expected.sample_order
+        assert d3arg.default_node_style == expected.default_node_style
+
+    @pytest.mark.parametrize("chunk_size", [1, 7, 100])
+    def test_small_chunks(self, chunk_size):
+        arg_json = self._arg_json()
+        meta, tables = argviz._read_argviz_json(io.StringIO(json.dumps(arg_json)), chunk_size=chunk_size)
+        assert meta["title"] == arg_json["title"]
+        assert "data" not in meta
+        for name, rows in arg_json["data"].items():
+            if name in tables:
+                assert pd.DataFrame(tables[name]).equals(pd.DataFrame(rows))
+
+    @pytest.mark.parametrize("text", ['{"data": {"nodes": [{"id": 1}', '{"width": 10 "data": {}}', "[]"])
+    def test_invalid(self, text):
+        with pytest.raises(ValueError):
+            argviz._read_argviz_json(io.StringIO(text))
+
 
 class TestSecondaryPositionUtilities:
     def test_extract_x_positions_from_json_smoke(self):
@@ -180,3 +863,31 @@ class TestSecondaryPositionUtilities:
                 height=100,
                 y_shift=0,
             )
+
+
+class TestImport:
+    def test_heavy_dependencies_are_imported_lazily(self):
+        heavy = ["IPython", "msprime", "pandas", "tskit"]
+        result = subprocess.run(
+            [
+                sys.executable, "-X", "importtime", "-c",
+                f"import sys, tskit_arg_visualizer; print([m for m in {heavy!r} if m in sys.modules])",
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        assert result.stdout.strip() == "[]"
+        # The import time is only reported (see pytest -s), as it depends on the machine
+        cumulative = {}
+        for line in result.stderr.splitlines():
+            if line.startswith("import time:") and "cumulative" not in line:
+                _, us, name = line.split("|")
+                cumulative[name.strip()] = int(us)
+        own = cumulative["tskit_arg_visualizer"] - cumulative.get("numpy", 0)
+        print(f"importing tskit_arg_visualizer took {own / 1e6:.3f} s, besides numpy")
+
+    def test_lazy_modules(self):
+        assert argviz._NODE_IS_RE_EVENT == msprime.NODE_IS_RE_EVENT
+        assert argviz.pd.DataFrame is pd.DataFrame
+        assert argviz.tskit.NULL == tskit.NULL
@@ -1,21 +1,23 @@
 import collections
+import hashlib
+import importlib
+import io
 import itertools
 import json
 import math
-import operator
+import numbers
 import os
 import random
+import re
+import shutil
 import tempfile
+import threading
 import warnings
 import webbrowser
 from dataclasses import dataclass
 from string import Template
 
-import msprime
 import numpy as np
-import pandas as pd
-import tskit
-from IPython.display import HTML, display
 
 __version__ = (
     "Using __version__ is deprecated. Please use "
@@ -23,6 +25,43 @@ __version__ = (
 )
 
 
+class _LazyModule:
+    """Stands in for a module, which is imported when one of its attributes is first used
+
+    pandas, tskit and IPython are slow to import and are not needed by everything that
+    imports this package (e.g. loading a saved D3ARG only to write it as HTML).
+    """
+
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self.__dict__["_module"] = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+pd = _LazyModule("pandas")
+tskit = _LazyModule("tskit")
+
+# msprime.NODE_IS_RE_EVENT, the flag of the two nodes that record a recombination event
+# in msprime.sim_ancestry(...,record_full_arg=True). Copied so as not to import msprime.
+_NODE_IS_RE_EVENT = 1 << 17
+
+
+def display(*objs, **kwargs):
+    """IPython.display.display, importing IPython only once something is displayed"""
+    from IPython.display import display
+    display(*objs, **kwargs)
+
+
+def HTML(data):
+    """IPython.display.HTML, importing IPython only once something is displayed"""
+    from IPython.display import HTML
+    return HTML(data)
+
+
 default_mutation_styles = {
     "size": 5,
     "unknown_time": {
@@ -71,7 +110,166 @@ class DrawInfo:
     Lists of objects included in the plot. At the moment this
     simply consists of included.nodes.
     """
-    
+
+@dataclass(frozen=True)
+class AdjacencyIndex:
+    """
+    Compressed sparse (offsets + indices) index of the links between nodes.
+
+    For the node at position ``i`` of ``node_ids``, the rows of the edges table
+    linking it to its parents are ``to_parents[parent_offsets[i]:parent_offsets[i+1]]``,
+    and likewise for its children. Rows are in edges table order.
+    """
+    node_ids: np.ndarray
+    """Sorted IDs of the indexed nodes."""
+    parent_offsets: np.ndarray
+    to_parents: np.ndarray
+    """Positions in the edges table of each node's links to its parents."""
+    child_offsets: np.ndarray
+    to_children: np.ndarray
+    """Positions in the edges table of each node's links to its children."""
+
+    @classmethod
+    def from_tables(cls, nodes, edges):
+        """Builds the index from D3ARG nodes and edges tables"""
+        node_ids = np.unique(nodes["id"].to_numpy(dtype=np.int64))
+        source = edges["source"].to_numpy(dtype=np.int64)
+        target = edges["target"].to_numpy(dtype=np.int64)
+        return cls(
+            node_ids,
+            *_csr_from_keys(np.searchsorted(node_ids, target), len(node_ids), np.isin(target, node_ids)),
+            *_csr_from_keys(np.searchsorted(node_ids, source), len(node_ids), np.isin(source, node_ids)),
+        )
+
+    def positions(self, ids):
+        """Positions of the given node IDs within node_ids, raising if any are missing"""
+        ids = np.atleast_1d(np.asarray(ids, dtype=np.int64))
+        pos = np.searchsorted(self.node_ids, ids)
+        missing = (pos == len(self.node_ids)) | (self.node_ids[np.minimum(pos, len(self.node_ids) - 1)] != ids)
+        if np.any(missing):
+            raise ValueError(f"Node '{ids[missing][0]}' not in the graph.")
+        return pos
+
+    def parent_links(self, ids):
+        """Rows of the edges table linking the given nodes to their parents"""
+        return _csr_gather(self.parent_offsets, self.to_parents, self.positions(ids))
+
+    def child_links(self, ids):
+        """Rows of the edges table linking the given nodes to their children"""
+        return _csr_gather(self.child_offsets, self.to_children, self.positions(ids))
+
+
+def _csr_from_keys(keys, num_keys, use):
+    """Groups the row positions by key, returning the offsets and grouped positions"""
+    rows = np.flatnonzero(use)
+    keys = keys[rows]
+    order = np.argsort(keys, kind="stable")
+    offsets = np.zeros(num_keys + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=num_keys), out=offsets[1:])
+    return offsets, rows[order]
+
+
+def _csr_gather(offsets, values, positions):
+    """Concatenates the CSR groups at the given positions"""
+    starts = offsets[positions]
+    lengths = offsets[positions + 1] - starts
+    shift = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return values[np.arange(len(shift)) + shift]
+
+
+@dataclass(frozen=True)
+class MergeHierarchy:
+    """
+    Order in which draw(zoom=...) collapses nodes into summary nodes.
+
+    Edges are visited from shortest to longest. Unless its child is a sample, each edge
+    merges the groups of nodes at its two ends, if they are different, into a summary
+    node. Merge ``k`` creates the summary node with ID ``first_summary_id + k``, and zoom
+    level ``z`` applies the first ``z`` merges.
+
+    Groups are numbered as in a dendrogram: ``0`` to ``N - 1`` are the nodes, at their
+    positions in node_ids, and ``N + k`` is the summary node created by merge ``k``.
+    """
+    node_ids: np.ndarray
+    """Sorted IDs of the nodes."""
+    merged_into: np.ndarray
+    """For each group, the merge that joins it into a larger one (-1 if none)."""
+    times: np.ndarray
+    """Time of each summary node: the mean time of the nodes that it contains."""
+    first_summary_id: int
+
+    @classmethod
+    def from_tables(cls, nodes, edges):
+        """Records every merge of the D3ARG nodes and edges tables, with a union-find"""
+        order = np.argsort(nodes["id"].to_numpy(dtype=np.int64), kind="stable")
+        node_ids = nodes["id"].to_numpy(dtype=np.int64)[order]
+        is_sample = (nodes["ts_flags"].to_numpy()[order] & tskit.NODE_IS_SAMPLE) != 0
+        num_nodes = len(node_ids)
+        source = edges["source"].to_numpy(dtype=np.int64)
+        target = edges["target"].to_numpy(dtype=np.int64)
+        use = np.isin(source, node_ids) & np.isin(target, node_ids)
+        source = np.searchsorted(node_ids, source[use])
+        target = np.searchsorted(node_ids, target[use])
+        length = (edges["source_time"].to_numpy() - edges["target_time"].to_numpy())[use]
+        shortest = np.argsort(length, kind="stable")
+        shortest = shortest[~is_sample[target[shortest]]]
+
+        root = list(range(num_nodes))  # union-find forest over node positions
+        group = list(range(num_nodes))  # group (node or summary node) of each root
+        size = [1] * num_nodes
+        mean = nodes["time"].to_numpy(dtype=np.float64)[order].tolist()
+        merged_into = np.full(2 * num_nodes, -1, dtype=np.int64)
+        times = []
+
+        def find(i):
+            while root[i] != i:
+                root[i] = root[root[i]]
+                i = root[i]
+            return i
+
+        for a, b in zip(source[shortest].tolist(), target[shortest].tolist()):
+            a, b = find(a), find(b)
+            if a == b:
+                continue
+            if size[a] < size[b]:
+                a, b = b, a
+            merge = len(times)
+            merged_into[group[a]] = merged_into[group[b]] = merge
+            root[b] = a
+            mean[a] = (size[a] * mean[a] + size[b] * mean[b]) / (size[a] + size[b])
+            size[a] += size[b]
+            group[a] = num_nodes + merge
+            times.append(mean[a])
+        return cls(
+            node_ids=node_ids,
+            merged_into=merged_into[:num_nodes + len(times)],
+            times=np.array(times, dtype=np.float64),
+            first_summary_id=int(node_ids[-1]) + 1 if num_nodes else 0,
+        )
+
+    def groups(self, zoom):
+        """Group of each node in node_ids once the first zoom merges have been applied"""
+        num_groups = len(self.node_ids) + min(zoom, len(self.times))
+        merged_into = self.merged_into[:num_groups]
+        merged = (merged_into != -1) & (merged_into < zoom)
+        # Each group starts as the group that it is merged into. Merge k only joins groups
+        # numbered below N + k, so one pass from the last group down resolves each group's
+        # parent to its final group before the group itself.
+        final = np.where(merged, len(self.node_ids) + merged_into, np.arange(num_groups)).tolist()
+        for g in range(num_groups - 1, -1, -1):
+            final[g] = final[final[g]]
+        return np.array(final[:len(self.node_ids)], dtype=np.int64)
+
+    def summary_ids(self, zoom):
+        """Node ID, or summary node ID, of each node in node_ids at a zoom level"""
+        groups = self.groups(zoom)
+        return np.where(
+            groups < len(self.node_ids),
+            self.node_ids[np.minimum(groups, len(self.node_ids) - 1)],
+            self.first_summary_id + groups - len(self.node_ids),
+        )
+
+
 def running_in_notebook():
     """Checks whether the code is being executed within a Jupyter Notebook.
 
@@ -154,8 +352,9 @@ def convert_time_to_position(t, min_time, max_time, scale, unique_times, h_spaci
         Maximum time along axis
     scale : str
         Axis scale to use (Options: "rank", "time", or "log_time).
-    unique_times : list
-        All of the node and mutation times used for determining rank of time.
+    unique_times : list or dict
+        All of the node and mutation times used for determining rank of time. Can also
+        be a dictionary of the rank of each time, which is faster to look up.
     h_spacing : float
         Gap between ranks
     height : int or float
@@ -168,7 +367,8 @@ def convert_time_to_position(t, min_time, max_time, scale, unique_times, h_spaci
         # Need to add a check that time in in unique_times
         if t not in unique_times:
             raise RuntimeError(f"Time {t} not in list of node and mutation times. This is required to calculate rank.")
-        return (1-unique_times.index(t)*h_spacing) * (height-100) + y_shift
+        rank = unique_times[t] if isinstance(unique_times, dict) else unique_times.index(t)
+        return (1-rank*h_spacing) * (height-100) + y_shift
     elif scale == "log_time":
         if (t < 0) or (min_time < 0) or (max_time < 0):
             raise ValueError("Cannot use log time scale with negative times.")
@@ -179,23 +379,232 @@ def convert_time_to_position(t, min_time, max_time, scale, unique_times, h_spaci
     return (1-(t-min_time)/time_range) * (height-100) + y_shift
 
 
-def draw_D3(arg_json, styles=None, is_notebook=None):
-    if is_notebook is None:
+def _split_template(text):
+    """Splits a string.Template into pieces for _fill_template
+
+    Returns a tuple of pieces, each either literal text or the (name, original text) of a
+    placeholder.
+    """
+    pieces = []
+    last = 0
+    for match in Template.pattern.finditer(text):
+        name = match.group("named") or match.group("braced")
+        if name is not None:
+            pieces += [text[last:match.start()], (name, match.group())]
+        elif match.group("escaped") is not None:
+            pieces.append(text[last:match.start()] + "$")
+        else:
+            continue  # a lone "$", which is kept as it is
+        last = match.end()
+    pieces.append(text[last:])
+    return tuple(pieces)
+
+
+def _fill_template(pieces, mapping):
+    """Same as Template.safe_substitute(mapping), for a template split by _split_template"""
+    return "".join(
+        piece if type(piece) is str else (str(mapping[piece[0]]) if piece[0] in mapping else piece[1])
+        for piece in pieces
+    )
+
+
+# Minified D3.js v7 shipped with the package, for drawings made with assets="inline"
+_VENDORED_D3 = os.path.join("vendor", "d3.v7.min.js")
+
+# Start of the call at the end of visualizer.js that draws a graph; everything before it is
+# the library of functions that notebook drawings share (see _notebook_library)
+_VISUALIZER_CALL = "/* NB: the code below fires up the visualizer"
+
+
+@dataclass(frozen=True)
+class _Assets:
+    """The files used for drawing, read from the package directory"""
+    visualizer_js: tuple
+    visualizer_css: str
+    genome_bar_js: tuple
+    d3_js: str | None  # None if the vendored copy of D3 is missing
+    visualizer_library: str  # visualizer.js up to _VISUALIZER_CALL
+    visualizer_call: tuple  # the rest of visualizer.js
+    library_key: str  # identifies visualizer_library and visualizer_css
+
+
+def _read_assets():
+    directory = os.path.dirname(__file__)
+
+    def read(name):
+        with open(os.path.join(directory, name), "r", encoding="utf-8") as f:
+            return f.read()
+
+    visualizer_js = read("visualizer.js")
+    visualizer_css = read("visualizer.css")
+    call = visualizer_js.index(_VISUALIZER_CALL)
+    library = _fill_template(_split_template(visualizer_js[:call]), {})
+    return _Assets(
+        visualizer_js=_split_template(visualizer_js),
+        visualizer_css=visualizer_css,
+        genome_bar_js=_split_template(read(os.path.join("alternative_plots", "genome_bar.js"))),
+        d3_js=read(_VENDORED_D3) if os.path.exists(os.path.join(directory, _VENDORED_D3)) else None,
+        visualizer_library=library,
+        visualizer_call=_split_template(visualizer_js[call:]),
+        library_key=hashlib.sha1((library + visualizer_css).encode("utf-8")).hexdigest()[:16],
+    )
+
+
+_assets = None
+_assets_lock = threading.Lock()
+
+
+def _get_assets():
+    """Returns the drawing assets, which are read from disk the first time that they are used"""
+    global _assets
+    if _assets is None:
+        with _assets_lock:
+            if _assets is None:
+                _assets = _read_assets()
+    return _assets
+
+
+def reload_assets():
+    """Re-reads visualizer.js, visualizer.css and genome_bar.js from disk
+
+    These are read once and then reused for every drawing, so changes to them (for example,
+    when developing the visualizer) only show up after calling this function.
+    """
+    global _assets
+    assets = _read_assets()
+    with _assets_lock:
+        _assets = assets
+
+
+# Shared notebook assets (see _notebook_library) already sent to the front end in this session
+_notebook_assets_sent = set()
+
+
+def reset_notebook_assets():
+    """Sends the shared drawing code again with the next notebook drawing
+
+    In a notebook, the CSS and JavaScript that all drawings use are only included in the output
+    of the first drawing of the session, and later drawings reuse them. If that output is no
+    longer on the page (for example, it was cleared and the page reloaded), later drawings show
+    a message rather than the graph: call this function and draw them again.
+    """
+    _notebook_assets_sent.clear()
+
+
+def _notebook_shares_page():
+    """Checks whether scripts in one notebook output are visible to the outputs of later cells
+
+    This is not the case in Google Colab, which shows each output in a separate frame.
+    """
+    try:
+        return get_ipython().__class__.__name__ != "Shell"
+    except NameError:
+        return True  # is_notebook=True in an untested environment
+
+
+def _notebook_library(files, scripts):
+    """Returns the shared code for a notebook drawing, or "" if it has already been sent
+
+    The functions in visualizer.js (and visualizer.css) are registered on the page once per
+    session under files.library_key, for _notebook_call to use. Inline D3 (scripts) is also only
+    sent once: if it goes missing, drawings fall back on loading D3 from the CDN.
+    """
+    html = ""
+    if scripts and scripts not in _notebook_assets_sent:
+        html += scripts
+        _notebook_assets_sent.add(scripts)
+    if files.library_key not in _notebook_assets_sent:
+        html += (
+            "<script>(function () {"
+            "var libs = globalThis.tskit_arg_visualizer_lib = globalThis.tskit_arg_visualizer_lib || {};"
+            f"if (libs['{files.library_key}'] !== undefined) return;\n"
+            + files.visualizer_library
+            + "\nvar style = document.createElement('style');"
+            + "style.textContent = " + json.dumps(files.visualizer_css).replace("<", "\\u003c") + ";"
+            + "document.head.appendChild(style);"
+            + f"libs['{files.library_key}'] = {{main_visualizer: main_visualizer, loadD3: loadD3}};"
+            + "})();</script>"
+        )
+        _notebook_assets_sent.add(files.library_key)
+    return html
+
+
+def _notebook_call(files, arg_json, arg_id):
+    """Returns the script that draws a notebook drawing with the code from _notebook_library"""
+    return (
+        "(function () {"
+        f"var lib = (globalThis.tskit_arg_visualizer_lib || {{}})['{files.library_key}'];"
+        "if (lib === undefined) {"
+        f"document.getElementById('{arg_id}').textContent = 'This drawing uses code that was sent "
+        "with an earlier tskit_arg_visualizer drawing, which is no longer on the page. Call "
+        "tskit_arg_visualizer.reset_notebook_assets() and draw it again.';"
+        "return;}"
+        "var main_visualizer = lib.main_visualizer, loadD3 = lib.loadD3;\n"
+        + _fill_template(files.visualizer_call, arg_json)
+        + "\n})();"
+    )
+
+
+def _d3_script(assets):
+    """Returns the <script> that a drawing needs before its own script, for the given assets option
+
+    With assets="cdn" the drawing loads require.js and D3 itself, so nothing is needed. With
+    assets="inline" the vendored D3 is embedded. It is run once per page, however many drawings
+    include it, and is kept out of the global "d3" (and AMD define) so as not to clash with any
+    other D3 on the page. visualizer.js and genome_bar.js look for it before loading from the CDN.
+    """
+    if assets == "cdn":
+        return ""
+    if assets != "inline":
+        raise ValueError(f"assets must be 'cdn' or 'inline', not {assets!r}")
+    d3_js = _get_assets().d3_js
+    if d3_js is None:
+        raise ValueError(
+            f"assets='inline' needs the vendored copy of D3 ({_VENDORED_D3}), which is missing "
+            "from this installation of tskit_arg_visualizer"
+        )
+    return (
+        "<script>if (typeof globalThis.tskit_arg_visualizer_d3 === 'undefined') {(function () {"
+        "var d3 = globalThis.d3; globalThis.d3 = undefined;"
+        "(function (define, exports, module) {\n"
+        + d3_js.replace("</script", "<\\/script")
+        + "\n}).call(globalThis);"
+        "globalThis.tskit_arg_visualizer_d3 = globalThis.d3; globalThis.d3 = d3;"
+        "})();}</script>"
+    )
+
+
+# Libraries loaded in the <head> of a standalone genome bar page
+_GENOME_BAR_SCRIPTS = (
+    "<script src='https://cdn.rawgit.com/eligrey/canvas-toBlob.js/f1a01896135ab378aa5c0118eadd81da55e698d8/canvas-toBlob.js'></script>"
+    "<script src='https://cdn.rawgit.com/eligrey/FileSaver.js/e9d941381475b5df8b7d7691013401e171014e89/FileSaver.min.js'></script>"
+    "<script src='https://d3js.org/d3.v7.min.js'></script>"
+)
+
+
+def draw_D3(arg_json, styles=None, is_notebook=None, output_path=None, assets="cdn"):
+    scripts = _d3_script(assets)
+    if output_path is not None:
+        is_notebook = False
+    elif is_notebook is None:
         is_notebook = running_in_notebook()
-    arg_json["source"] = json.dumps(arg_json.copy())  # first escape the plain json data
-    arg_json = {k: json.dumps(v) for k, v in arg_json.items()}  # now escape all
+    # The full JSON is embedded once, as a data block that visualizer.js parses for drawing
+    # and again for "Download JSON". "<" only occurs within JSON strings, so escaping it
+    # keeps e.g. a "</script>" label from closing the block. Non-finite floats are written
+    # as the strings of _NON_FINITE_JSON, so that the block is strictly valid JSON. It is
+    # generated in chunks, so that a page written to a file never holds all of it in memory.
+    source = (chunk.replace("<", "\\u003c") for chunk in _iter_json(arg_json))
+    arg_json = {k: json.dumps(v) for k, v in arg_json.items() if k != "data"}
     arg_json["divnum"] = str(random.randint(0,9999999999))
     arg_id = "arg_" + arg_json['divnum']
-    JS_text = Template((
+    files = _get_assets()
+    main_text = _fill_template(files.visualizer_js, arg_json)
+    html_start = (
         '<div id="{}" class="d3arg" style="min-width:{}px; min-height:{}px;"></div>'
-        '<script>$main_text</script>'
-    ).format(arg_id, float(arg_json["width"]) + 40, float(arg_json["height"]) + 80))
-    with open(os.path.dirname(__file__) + "/visualizer.js", "r") as visualizerjs:
-        main_text_template = Template(visualizerjs.read())
-    main_text = main_text_template.safe_substitute(arg_json)
-    html = JS_text.safe_substitute({'main_text': main_text})
-    with open(os.path.dirname(__file__) + "/visualizer.css", "r") as css:
-        general_styles = css.read()
+        '<script type="application/json" id="{}_source">'
+    ).format(arg_id, float(arg_json["width"]) + 40, float(arg_json["height"]) + 80, arg_id)
+    html_end = "</script><script>" + main_text + "</script>"
+    general_styles = files.visualizer_css
     specific_styles = ""
     if styles is not None:
         if isinstance(styles, str):
@@ -206,18 +615,23 @@ def draw_D3(arg_json, styles=None, is_notebook=None):
             # prevent minor footguns e.g. accidentally closing the style tag
             # Note this doesn't stop malicious user code e.g. url() loading
             raise ValueError("Listed styles cannot contain the '<' sign.")
-    styles = f"<style>{general_styles}</style>"
     if specific_styles:
-        styles += f"<style>{specific_styles}</style>"
-
-    if is_notebook:
-        display(HTML(styles + html))
+        specific_styles = f"<style>{specific_styles}</style>"
+    styles = f"<style>{general_styles}</style>" + specific_styles + scripts
+
+    if is_notebook and _notebook_shares_page():
+        # Only the data and the call to draw it, with the shared code sent once per session
+        library = _notebook_library(files, scripts)
+        call = _notebook_call(files, arg_json, arg_id)
+        display(HTML(library + specific_styles + html_start + "".join(source) + "</script><script>" + call + "</script>"))
+    elif is_notebook:
+        display(HTML(styles + html_start + "".join(source) + html_end))
+    elif output_path is not None:
+        _write_html_page(output_path, styles, itertools.chain([html_start], source, [html_end]))
     else:
-        with tempfile.NamedTemporaryFile("w", delete=False, suffix=".html") as f:
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", delete=False, suffix=".html") as f:
             url = "file://" + f.name
-            f.write("<!DOCTYPE html><html>")
-            f.write("<head><meta charset='utf-8'>" + styles + "</head>")
-            f.write("<body>" + html + "</body></html>")
+            _write_html_page(f, styles, itertools.chain([html_start], source, [html_end]))
         webbrowser.open(url, new=2)
     return DrawInfo(
         width=arg_json["width"],
@@ -263,6 +677,883 @@ def extract_x_positions_from_json(arg_json):
     return x_pos_01
 
 
+# Fields holding pixel positions or lengths, which are rounded by coordinate_precision
+_COORDINATE_FIELDS = ("x", "y", "fx", "fy", "x_pos", "width")
+
+
+def _round_coordinate(value, precision):
+    """Rounds a float, or each float in a list, to the given number of decimal places"""
+    if isinstance(value, float):
+        return round(value, precision)
+    if isinstance(value, list):
+        return [_round_coordinate(v, precision) for v in value]
+    return value
+
+
+def _columns_from_rows(rows):
+    """Converts a list of row dictionaries into the columnar form rebuilt by visualizer.js
+
+    The result is {"length": number of rows, "columns": {field: column}}. A column is either
+    the list of values, {"value": value} if all of the values are the same, {"dict": distinct
+    values, "codes": index of each value} for strings or numbers with many repeats (such as
+    colors), or {"rows": row indices, "values": column} if only some of the rows have the field.
+    """
+
+    fields = list(dict.fromkeys(field for row in rows for field in row))
+    columns = {}
+    for field in fields:
+        with_field = [i for i, row in enumerate(rows) if field in row]
+        values = [rows[i][field] for i in with_field]
+        column = values
+        scalar = all(isinstance(v, str) for v in values) or all(
+            isinstance(v, numbers.Real) and not isinstance(v, (bool, np.bool_)) for v in values
+        )
+        if scalar and len(values) > 0:
+            codes, distinct = pd.factorize(np.array(values, dtype=object), use_na_sentinel=False)
+            if len(distinct) == 1:
+                column = {"value": distinct[0]}
+            elif len(distinct) <= len(values) // 2:
+                column = {"dict": distinct.tolist(), "codes": codes.tolist()}
+        if len(with_field) < len(rows):
+            column = {"rows": with_field, "values": column}
+        columns[field] = column
+    return {"length": len(rows), "columns": columns}
+
+
+def _compact_data(data, columnar=False, precision=None):
+    """Applies the coordinate_precision and columnar_data options to the "data" of a drawing"""
+    tables = ("nodes", "links", "mutations", "breakpoints")
+    if precision is not None:
+        for name in tables:
+            for row in data[name]:
+                for field in _COORDINATE_FIELDS:
+                    if field in row:
+                        row[field] = _round_coordinate(row[field], precision)
+        data["evenly_distributed_positions"] = _round_coordinate(
+            list(data["evenly_distributed_positions"]), precision
+        )
+    if columnar:
+        for name in tables:
+            data[name] = _columns_from_rows(data[name])
+    return data
+
+
+def _json_default(value):
+    """Converts NumPy scalars for json, as DataFrame.to_dict() does"""
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+_JSON_ENCODER = json.JSONEncoder(default=_json_default)
+
+# NaN and infinities are not valid JSON, so the data of a drawing holds them as these
+# strings, which read_source() in visualizer.js turns back into numbers
+_NON_FINITE_JSON = {name: json.dumps("\0" + name) for name in ("NaN", "Infinity", "-Infinity")}
+
+
+def _finite_json(obj):
+    """Replaces the non-finite floats within lists and dictionaries by the strings of _NON_FINITE_JSON"""
+    if isinstance(obj, float) and not math.isfinite(obj):
+        return "\0" + ("NaN" if math.isnan(obj) else ("Infinity" if obj > 0 else "-Infinity"))
+    if isinstance(obj, (list, tuple)):
+        return [_finite_json(v) for v in obj]
+    if isinstance(obj, dict):
+        return {k: _finite_json(v) for k, v in obj.items()}
+    return obj
+
+
+def _dumps_finite(obj):
+    """json.dumps() with non-finite floats written as the strings of _NON_FINITE_JSON"""
+    try:
+        return json.dumps(obj, allow_nan=False)
+    except ValueError:  # only walk the object when it holds a non-finite float
+        return json.dumps(_finite_json(obj))
+
+# Number of table rows that are turned into JSON text at a time
+_JSON_CHUNK_ROWS = 2000
+
+
+def _json_values(column):
+    """Returns the JSON text of each value in a column, as json.dumps() writes it, except
+    that non-finite floats are written as the strings of _NON_FINITE_JSON
+
+    Parameters
+    ----------
+    column : pd.Series
+        Column of a table
+
+    Returns
+    -------
+    list
+        One string per row
+    """
+
+    values = column.to_numpy()
+    if values.dtype.kind in "iu":
+        return list(map(str, values.tolist()))
+    if values.dtype.kind == "b":
+        return np.where(values, "true", "false").tolist()
+    if values.dtype.kind == "f":
+        texts = list(map(float.__repr__, values.tolist()))
+        non_finite = np.flatnonzero(~np.isfinite(values))
+        if len(non_finite) > 0:
+            special = np.where(np.isnan(values), "NaN", np.where(values > 0, "Infinity", "-Infinity"))
+            for i in non_finite.tolist():
+                texts[i] = _NON_FINITE_JSON[str(special[i])]
+        return texts
+    values = values.tolist()
+    if all(type(v) is str for v in values):
+        return list(map(json.encoder.encode_basestring_ascii, values))
+    return list(map(_JSON_ENCODER.encode, values))
+
+
+@dataclass
+class _JSONRecords:
+    """A table that is written to JSON as a list of row objects, straight from its columns
+
+    Rows are written the way json.dumps(frame.to_dict("records")) writes them, except that
+    a field is left out of the rows flagged in ``absent`` (used for fields such as "fx",
+    which only some of the nodes have). The first column cannot have absent rows.
+    """
+    frame: "pd.DataFrame"
+    absent: dict
+
+    def __len__(self):
+        return len(self.frame)
+
+    def rows(self):
+        """Returns the table as a list of row dictionaries"""
+        rows = self.frame.to_dict("records")
+        for field, absent in self.absent.items():
+            for i in np.flatnonzero(absent):
+                del rows[i][field]
+        return rows
+
+    def iter_json(self, chunk_rows=_JSON_CHUNK_ROWS):
+        """Yields the JSON text of the list of rows, in chunks of up to chunk_rows rows"""
+        if len(self.frame) == 0:
+            yield "[]"
+            return
+        prefixes = [
+            ("{" if i == 0 else ", ") + json.dumps(str(name)) + ": " for i, name in enumerate(self.frame.columns)
+        ]
+        for start in range(0, len(self.frame), chunk_rows):
+            chunk = self.frame if len(self.frame) <= chunk_rows else self.frame.iloc[start:start + chunk_rows]
+            fields = []
+            for prefix, (name, column) in zip(prefixes, chunk.items()):
+                texts = list(map(prefix.__add__, _json_values(column)))
+                if name in self.absent:
+                    for j in np.flatnonzero(self.absent[name][start:start + chunk_rows]):
+                        texts[j] = ""
+                fields.append(texts)
+            fields.append(["}"] * len(chunk))
+            yield ("[" if start == 0 else ", ") + ", ".join(map("".join, zip(*fields)))
+        yield "]"
+
+    def to_json(self):
+        """Returns the JSON text of the list of rows"""
+        return "".join(self.iter_json())
+
+
+def _set_record_field(records, field, values, where=None):
+    """Sets a field of the rows in ``where`` (default=all rows), as setting it row by row would
+
+    A new field becomes the last column, and is absent from the other rows. An existing
+    field keeps its current values in the other rows.
+    """
+    frame = records.frame
+    values = np.asarray(values)
+    if where is None or where.all():
+        frame[field] = values
+    elif field in frame:
+        existing = frame[field].to_numpy()
+        if existing.dtype != values.dtype:
+            existing, values = existing.astype(object), values.astype(object)
+        frame[field] = np.where(where, values, existing)
+    else:
+        frame[field] = values
+        records.absent[field] = ~where
+
+
+def _iter_json(obj, chunk_rows=_JSON_CHUNK_ROWS):
+    """Yields the text of json.dumps(obj) in chunks, writing any _JSONRecords from their columns
+
+    Dictionaries with string keys are written value by value, and lists chunk_rows items at a
+    time, so that no chunk is much larger than chunk_rows rows of a table. Non-finite floats
+    are written as the strings of _NON_FINITE_JSON, so that the text is strictly valid JSON.
+    """
+    if isinstance(obj, _JSONRecords):
+        yield from obj.iter_json(chunk_rows)
+    elif isinstance(obj, dict) and all(type(k) is str for k in obj):
+        opening = "{"
+        for key, value in obj.items():
+            yield opening + json.dumps(key) + ": "
+            yield from _iter_json(value, chunk_rows)
+            opening = ", "
+        yield "}" if opening == ", " else "{}"
+    elif isinstance(obj, list) and len(obj) > chunk_rows:
+        for start in range(0, len(obj), chunk_rows):
+            yield ("[" if start == 0 else ", ") + _dumps_finite(obj[start:start + chunk_rows])[1:-1]
+        yield "]"
+    else:
+        yield _dumps_finite(obj)
+
+
+def _dumps_json(obj):
+    """json.dumps() that writes any _JSONRecords, including those within dictionaries (see _iter_json)"""
+    return "".join(_iter_json(obj))
+
+
+def _write_html_page(output, head, body):
+    """Writes a standalone HTML page, from the HTML of its head and the chunks of its body
+
+    Parameters
+    ----------
+    output : str, os.PathLike or file object
+        Path of the file to write, or an open text file (or io.StringIO) to write into
+    head : str
+        Contents of the <head>, such as <style> elements
+    body : iterable of str
+        Contents of the <body>, written one chunk at a time
+    """
+    if not hasattr(output, "write"):
+        with open(output, "w", encoding="utf-8") as f:
+            _write_html_page(f, head, body)
+        return
+    output.write("<!DOCTYPE html><html>")
+    output.write("<head><meta charset='utf-8'>" + head + "</head><body>")
+    for chunk in body:
+        output.write(chunk)
+    output.write("</body></html>")
+
+
+def _merge_edge_intervals(edge_link, left, right, num_links):
+    """Combines the intervals of the tskit edges that make up each link
+
+    Intervals are concatenated (and their spans summed) in edge table order, matching
+    the "bounds" strings and region sizes produced edge by edge.
+
+    Parameters
+    ----------
+    edge_link : np.array
+        The link ID of each edge
+    left : np.array
+        Left coordinate of each edge
+    right : np.array
+        Right coordinate of each edge
+    num_links : int
+        Total number of links
+
+    Returns
+    -------
+    bounds : np.array
+        Object array of "left-right" strings, space separated, one per link
+    region_size : np.array
+        Total span of the intervals in each link
+    """
+
+    order = np.argsort(edge_link, kind="stable")
+    counts = np.bincount(edge_link, minlength=num_links)
+    offsets = np.cumsum(counts) - counts
+    # Format each distinct coordinate only once, there are far fewer of them than edges
+    coords, coord_index = np.unique(np.concatenate((left, right)), return_inverse=True)
+    coord_str = np.array([repr(c) for c in coords.tolist()], dtype=object)
+    coord_index = coord_index.reshape(-1)
+    edge_str = coord_str[coord_index[:len(left)]] + "-" + coord_str[coord_index[len(left):]]
+    edge_str = edge_str[order]
+    span = (right - left)[order]
+
+    bounds = edge_str[offsets] if len(edge_str) else np.array([], dtype=object)
+    region_size = span[offsets] if len(span) else np.array([], dtype=np.float64)
+    # Links sorted by decreasing edge count, so the links that still have an interval
+    # left to add at step k are always a prefix of this ordering
+    by_count = np.argsort(-counts, kind="stable")
+    sorted_counts = counts[by_count]
+    for k in range(1, sorted_counts[0] if num_links else 0):
+        active = by_count[:np.searchsorted(-sorted_counts, -k)]
+        bounds[active] = bounds[active] + " " + edge_str[offsets[active] + k]
+        region_size[active] = region_size[active] + span[offsets[active] + k]
+    return bounds, region_size
+
+
+def _check_intervals(interval, sequence_length):
+    """Validates genomic intervals passed to D3ARG.from_ts()
+
+    Parameters
+    ----------
+    interval : list(float, float) or list of lists or None
+        A single [left, right) interval or a list of them
+    sequence_length : float
+        Length of the tree sequence
+
+    Returns
+    -------
+    intervals : np.array or None
+        Array of shape (num_intervals, 2), sorted by left coordinate, or None if no interval
+        was given
+    """
+
+    if interval is None:
+        return None
+    intervals = np.asarray(interval, dtype=np.float64)
+    if intervals.ndim == 1:
+        intervals = intervals.reshape(1, -1)
+    if (intervals.ndim != 2) or (intervals.shape[1] != 2) or (len(intervals) == 0):
+        raise ValueError("Interval must be a [left, right] pair or a list of such pairs.")
+    intervals = intervals[np.argsort(intervals[:, 0], kind="stable")]
+    if np.any(intervals[:, 0] >= intervals[:, 1]):
+        raise ValueError("Each interval must have left < right.")
+    if (intervals[0, 0] < 0) or (intervals[-1, 1] > sequence_length):
+        raise ValueError(f"Intervals must be within the sequence (0 to {sequence_length}).")
+    if np.any(intervals[1:, 0] < intervals[:-1, 1]):
+        raise ValueError("Intervals must not overlap.")
+    return intervals
+
+
+def _clip_to_intervals(left, right, intervals):
+    """Clips [left, right) ranges (such as edges) to genomic intervals
+
+    Parameters
+    ----------
+    left : np.array
+    right : np.array
+    intervals : np.array or None
+        Sorted, non-overlapping intervals. If None, the ranges are returned unchanged.
+
+    Returns
+    -------
+    index : np.array
+        Index of the range that each clipped piece came from, in increasing order
+    left : np.array
+        Clipped left coordinates
+    right : np.array
+        Clipped right coordinates
+    """
+
+    if intervals is None:
+        return np.arange(len(left)), left, right
+    index, clipped_left, clipped_right = [], [], []
+    for start, stop in intervals:
+        overlap = np.flatnonzero((left < stop) & (right > start))
+        index.append(overlap)
+        clipped_left.append(np.maximum(left[overlap], start))
+        clipped_right.append(np.minimum(right[overlap], stop))
+    index = np.concatenate(index)
+    order = np.argsort(index, kind="stable")
+    return index[order], np.concatenate(clipped_left)[order], np.concatenate(clipped_right)[order]
+
+
+def _in_intervals(positions, intervals):
+    """Whether each position is within one of the sorted, non-overlapping intervals"""
+    which = np.searchsorted(intervals[:, 0], positions, side="right") - 1
+    return (which >= 0) & (positions < intervals[np.maximum(which, 0), 1])
+
+
+def _window_position(positions, intervals):
+    """Converts genomic positions to positions along the intervals placed end to end"""
+    if intervals is None:
+        return positions
+    which = np.maximum(np.searchsorted(intervals[:, 0], positions, side="right") - 1, 0)
+    preceding = np.concatenate(([0], np.cumsum(intervals[:, 1] - intervals[:, 0])[:-1]))
+    return preceding[which] + positions - intervals[which, 0]
+
+
+def _total_length(intervals, sequence_length):
+    """Total length of the intervals, or of the sequence if there are none"""
+    if intervals is None:
+        return sequence_length
+    return float(np.sum(intervals[:, 1] - intervals[:, 0]))
+
+
+def _check_time_window(time_window):
+    """Validates a time window passed to D3ARG.from_ts() or D3ARG.draw()
+
+    Parameters
+    ----------
+    time_window : list(float, float) or None
+        The (t_min, t_max) pair. Either side can be None to leave it open.
+
+    Returns
+    -------
+    time_window : tuple(float, float) or None
+        The (t_min, t_max) pair with open sides set to infinity, or None if no window
+    """
+    if time_window is None:
+        return None
+    if len(time_window) != 2:
+        raise ValueError("time_window must be a (t_min, t_max) pair.")
+    t_min = -np.inf if time_window[0] is None else float(time_window[0])
+    t_max = np.inf if time_window[1] is None else float(time_window[1])
+    if np.isnan(t_min) or np.isnan(t_max) or (t_min > t_max):
+        raise ValueError("time_window must have t_min <= t_max.")
+    return t_min, t_max
+
+
+def _group_sorted_pairs(keys, values, ids):
+    """Collects the values for each of the given IDs from (key, value) pairs sorted by key
+
+    Parameters
+    ----------
+    keys : np.array
+        Sorted keys
+    values : np.array
+        Value of each pair
+    ids : np.array
+        Sorted IDs to collect the values of
+
+    Returns
+    -------
+    lists : list
+        One (sorted if values are sorted within keys) list of values per ID
+    counts : np.array
+        Number of values for each ID
+    first : np.array
+        First value for each ID, or -1 if there are none
+    """
+
+    starts = np.searchsorted(keys, ids, side="left")
+    stops = np.searchsorted(keys, ids, side="right")
+    flat = values.tolist()
+    lists = [flat[start:stop] for start, stop in zip(starts.tolist(), stops.tolist())]
+    counts = stops - starts
+    first = np.full(len(ids), -1, dtype=np.int64)
+    first[counts > 0] = values[starts[counts > 0]]
+    return lists, counts, first
+
+
+def _unpack_ragged_strings(data, offset):
+    """Decodes a tskit ragged text column (e.g. derived_state) into an array of strings
+
+    Parameters
+    ----------
+    data : np.array
+        Packed int8 bytes of the column
+    offset : np.array
+        Offsets of each row into data
+
+    Returns
+    -------
+    strings : np.array
+        Object array with one string per row
+    """
+
+    lengths = np.diff(offset)
+    if len(lengths) == 0:
+        return np.array([], dtype=object)
+    if (lengths[0] > 0) and np.all(lengths == lengths[0]):
+        # Fixed width (normally single character) states can be decoded in one go
+        fixed = data.view(f"S{lengths[0]}")
+        if np.all(np.char.str_len(fixed) == lengths[0]):
+            return np.char.decode(fixed, "utf-8").astype(object)
+    packed = data.tobytes()
+    return np.array(
+        [packed[start:stop].decode("utf-8") for start, stop in zip(offset[:-1].tolist(), offset[1:].tolist())],
+        dtype=object,
+    )
+
+
+def _minlex_postorder(tree):
+    """Returns the nodes of a tree in "minlex_postorder", computed with array operations
+
+    Equivalent to np.array(list(tree.nodes(order="minlex_postorder"))). Children (and
+    roots) are visited in order of the smallest leaf ID below them. Subtree minima and
+    sizes are accumulated upwards, and each node's position downwards, by pointer
+    jumping so that the cost is O(N log depth) rather than a Python traversal.
+
+    Parameters
+    ----------
+    tree : tskit.Tree
+
+    Returns
+    -------
+    order : np.array
+        Node IDs in minlex postorder
+    """
+
+    nodes = tree.preorder().astype(np.int64)
+    parent = tree.parent_array.astype(np.int64)
+    num_children = np.bincount(parent[nodes][parent[nodes] != -1], minlength=len(parent))
+    min_leaf = np.full(len(parent), np.iinfo(np.int64).max)
+    is_leaf = num_children[nodes] == 0
+    min_leaf[nodes[is_leaf]] = nodes[is_leaf]
+    size = np.zeros(len(parent), dtype=np.int64)
+    size[nodes] = 1
+    # Upwards: after step k, each node has accounted for descendants less than 2^k below it
+    jump = parent.copy()
+    below = nodes[jump[nodes] != -1]
+    while len(below):
+        new_min_leaf = min_leaf.copy()
+        new_size = size.copy()
+        np.minimum.at(new_min_leaf, jump[below], min_leaf[below])
+        np.add.at(new_size, jump[below], size[below])
+        min_leaf, size = new_min_leaf, new_size
+        jump[below] = jump[jump[below]]
+        below = below[jump[below] != -1]
+    # Offset of each node among its siblings: the total size of siblings visited before it
+    by_parent = nodes[np.lexsort((min_leaf[nodes], parent[nodes]))]
+    sibling_parent = parent[by_parent]
+    group_start = np.ones(len(by_parent), dtype=bool)
+    group_start[1:] = sibling_parent[1:] != sibling_parent[:-1]
+    preceding = np.cumsum(size[by_parent]) - size[by_parent]
+    offset = np.zeros(len(parent), dtype=np.int64)
+    offset[by_parent] = preceding - np.maximum.accumulate(np.where(group_start, preceding, 0))
+    # Downwards: sum the offsets of each node and all of its ancestors
+    jump = parent.copy()
+    above = nodes[jump[nodes] != -1]
+    while len(above):
+        offset[above] += offset[jump[above]]
+        jump[above] = jump[jump[above]]
+        above = above[jump[above] != -1]
+    return nodes[np.argsort(offset[nodes] + size[nodes] - 1)]
+
+
+# Arrays that each kind of stored column is split into
+_COLUMN_PARTS = {
+    "array": ("values",),
+    "string": ("codes", "data", "offset"),
+    "category": ("codes", "data", "offset"),
+    "json": ("codes", "data", "offset"),
+    "list": ("offset", "values"),
+}
+_STORAGE_VERSION = 1
+
+
+def _pack_strings(strings):
+    """Packs strings into utf-8 bytes and offsets, the inverse of _unpack_ragged_strings()"""
+    encoded = [s.encode("utf-8") for s in strings]
+    offset = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offset[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.int8), offset
+
+
+def _encode_column(column):
+    """Splits a D3ARG table column into flat arrays for storage
+
+    Numeric columns are stored as they are. String columns are dictionary encoded, with the
+    distinct values packed into bytes + offsets. Columns of lists (such as "child_of") are
+    stored as offsets + values. Anything else is stored as dictionary encoded JSON strings.
+
+    Parameters
+    ----------
+    column : pd.Series
+
+    Returns
+    -------
+    kind : str
+        One of the keys of _COLUMN_PARTS
+    arrays : dict
+        The arrays named in _COLUMN_PARTS[kind]
+    """
+
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        data, offset = _pack_strings([str(c) for c in column.cat.categories])
+        return "category", {"codes": column.cat.codes.to_numpy(), "data": data, "offset": offset}
+    if column.dtype.kind in "biuf":
+        return "array", {"values": column.to_numpy()}
+    values = column.to_numpy(dtype=object)
+    kind = "string"
+    if all(isinstance(v, list) for v in values) and len(values):
+        offset = np.zeros(len(values) + 1, dtype=np.int64)
+        np.cumsum([len(v) for v in values], out=offset[1:])
+        flat = np.asarray([x for v in values for x in v])
+        return "list", {"offset": offset, "values": flat if len(flat) else flat.astype(np.int64)}
+    if not all(isinstance(v, str) for v in values):
+        kind = "json"
+        values = np.array([json.dumps(v) for v in values], dtype=object)
+    codes, uniques = pd.factorize(values)
+    data, offset = _pack_strings(uniques)
+    return kind, {"codes": codes.astype(np.int32), "data": data, "offset": offset}
+
+
+def _decode_column(kind, arrays):
+    """Rebuilds a D3ARG table column from the arrays made by _encode_column()"""
+    if kind == "array":
+        return arrays["values"].view(np.ndarray)  # memory-mapped arrays are kept as plain views
+    if kind == "list":
+        flat = arrays["values"].tolist()
+        offset = arrays["offset"].tolist()
+        return [flat[start:stop] for start, stop in zip(offset[:-1], offset[1:])]
+    uniques = _unpack_ragged_strings(arrays["data"], arrays["offset"])
+    if kind == "category":
+        return pd.Categorical.from_codes(arrays["codes"], categories=uniques)
+    if kind == "json":
+        decoded = np.empty(len(uniques), dtype=object)
+        decoded[:] = [json.loads(u) for u in uniques]
+        uniques = decoded
+    return uniques[arrays["codes"]]
+
+
+def _write_d3arg(d3arg, path):
+    """Writes the tables and attributes of a D3ARG into a directory of .npy files
+
+    Each column is split by _encode_column() into arrays saved as "{table}.{column}.{part}.npy",
+    where column is the position of the column in the table. "meta.json" lists the columns
+    and holds the other attributes. It is written last, so only complete directories have it.
+    """
+
+    os.makedirs(path, exist_ok=True)
+    if os.path.exists(os.path.join(path, "meta.json")):
+        os.remove(os.path.join(path, "meta.json"))  # a previous save is incomplete until rewritten
+    meta = {
+        "version": _STORAGE_VERSION,
+        "num_samples": int(d3arg.num_samples),
+        "sample_order": [int(s) for s in d3arg.sample_order],
+        "default_node_style": d3arg.default_node_style,
+        "time_units": d3arg.time_units,
+        "tables": {},
+    }
+    for name in ("nodes", "edges", "mutations", "breakpoints"):
+        table = getattr(d3arg, name)
+        columns = []
+        for i, column in enumerate(table.columns):
+            kind, arrays = _encode_column(table[column])
+            for part, array in arrays.items():
+                np.save(os.path.join(path, f"{name}.{i}.{part}.npy"), array, allow_pickle=False)
+            columns.append([column, kind])
+        has_index = not table.index.equals(pd.RangeIndex(len(table)))
+        if has_index:
+            np.save(os.path.join(path, f"{name}.index.npy"), table.index.to_numpy(), allow_pickle=False)
+        meta["tables"][name] = {"columns": columns, "index": has_index}
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump(meta, f)
+
+
+def _read_d3arg(path, mmap_mode=None):
+    """Reads a directory written by _write_d3arg(), returning the arguments for D3ARG()"""
+    with open(os.path.join(path, "meta.json"), "r") as f:
+        meta = json.load(f)
+    if meta["version"] != _STORAGE_VERSION:
+        raise ValueError(f"Unsupported D3ARG storage version {meta['version']}.")
+    tables = {}
+    for name, info in meta["tables"].items():
+        data = {}
+        for i, (column, kind) in enumerate(info["columns"]):
+            arrays = {
+                part: np.load(os.path.join(path, f"{name}.{i}.{part}.npy"), mmap_mode=mmap_mode)
+                for part in _COLUMN_PARTS[kind]
+            }
+            data[column] = _decode_column(kind, arrays)
+        index = np.load(os.path.join(path, f"{name}.index.npy"), mmap_mode=mmap_mode) if info["index"] else None
+        tables[name] = pd.DataFrame(data, index=index, copy=False)
+    return dict(
+        tables,
+        num_samples=meta["num_samples"],
+        sample_order=meta["sample_order"],
+        default_node_style=meta["default_node_style"],
+        time_units=meta["time_units"],
+    )
+
+
+_JSON_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def _read_argviz_json(f, chunk_size=1 << 22):
+    """Incrementally reads an ARGviz JSON file, collecting the table rows into columns
+
+    The file is read in chunks and the rows of "data.nodes", "data.links", "data.mutations"
+    and "data.breakpoints" are decoded one at a time, so that the whole document is never
+    held in memory as text or as per-row dictionaries.
+
+    Parameters
+    ----------
+    f : file
+        Text file object positioned at the start of the JSON document
+    chunk_size : int
+        Number of characters to read at a time
+
+    Returns
+    -------
+    meta : dict
+        All top level values other than "data"
+    tables : dict
+        Each table name mapped to a dictionary of column name to pd.Series
+    """
+
+    raw_decode = json.JSONDecoder().raw_decode
+    state = {"buf": "", "pos": 0, "eof": False}
+
+    def read_more():
+        buf = state["buf"][state["pos"]:]
+        chunk = f.read(max(chunk_size, len(buf)))  # at least doubles the buffer for long values
+        state["buf"], state["pos"], state["eof"] = buf + chunk, 0, len(chunk) == 0
+
+    def peek():
+        while True:
+            state["pos"] = _JSON_WHITESPACE.match(state["buf"], state["pos"]).end()
+            if state["pos"] < len(state["buf"]):
+                return state["buf"][state["pos"]]
+            if state["eof"]:
+                raise ValueError("Unexpected end of JSON file.")
+            read_more()
+
+    def expect(char):
+        if peek() != char:
+            raise ValueError(f"Invalid ARGviz JSON file: expecting '{char}'.")
+        state["pos"] += 1
+
+    def decode():
+        peek()
+        while True:
+            try:
+                value, end = raw_decode(state["buf"], state["pos"])
+                if (end < len(state["buf"])) or state["eof"]:  # a number could continue in the next chunk
+                    state["pos"] = end
+                    return value
+            except json.JSONDecodeError:
+                if state["eof"]:
+                    raise
+            read_more()
+
+    def separator(close):
+        """Consumes a "," (returning False) or the closing bracket (returning True)"""
+        char = peek()
+        if char not in ("," + close):
+            raise ValueError(f"Invalid ARGviz JSON file: expecting ',' or '{close}'.")
+        state["pos"] += 1
+        return char == close
+
+    def read_rows():
+        expect("[")
+        columns = {}
+        num_rows = 0
+        plans = {}  # for each (ordered) set of row keys: appends for the given and missing columns
+        if peek() == "]":
+            state["pos"] += 1
+        else:
+            match = _JSON_WHITESPACE.match
+            while True:
+                buf = state["buf"]
+                try:
+                    row, state["pos"] = raw_decode(buf, match(buf, state["pos"]).end())
+                except json.JSONDecodeError:
+                    row = decode()  # the row continues into the next chunk
+                keys = tuple(row)
+                plan = plans.get(keys)
+                if plan is None:
+                    for key in keys:
+                        if key not in columns:
+                            columns[key] = [np.nan] * num_rows
+                            plans.clear()
+                    plan = plans[keys] = (
+                        [columns[key].append for key in keys],
+                        [column.append for key, column in columns.items() if key not in row],
+                    )
+                given, missing = plan
+                for append, value in zip(given, row.values()):
+                    append(value)
+                for append in missing:
+                    append(np.nan)
+                num_rows += 1
+                buf = state["buf"]
+                pos = match(buf, state["pos"]).end()
+                if (pos < len(buf)) and (buf[pos] == ","):
+                    state["pos"] = pos + 1
+                elif separator("]"):
+                    break
+        # Converted one at a time so only one column is held twice
+        return {key: pd.Series(columns.pop(key)) for key in list(columns)}
+
+    def read_object(on_value):
+        expect("{")
+        if peek() == "}":
+            state["pos"] += 1
+            return
+        while True:
+            key = decode()
+            expect(":")
+            on_value(key)
+            if separator("}"):
+                return
+
+    meta, tables = {}, {}
+
+    def on_data_value(key):
+        if key in ("nodes", "links", "mutations", "breakpoints"):
+            tables[key] = read_rows()
+        else:
+            decode()  # not needed to rebuild the D3ARG
+
+    def on_top_level_value(key):
+        if key == "data":
+            read_object(on_data_value)
+        else:
+            meta[key] = decode()
+
+    read_object(on_top_level_value)
+    return meta, tables
+
+
+def _package_version():
+    """Installed version of tskit_arg_visualizer, or None when it is run from a source tree"""
+    import importlib.metadata
+
+    try:
+        return importlib.metadata.version("tskit_arg_visualizer")
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+def _hash_tables(ts):
+    """Hex SHA-256 digest of the contents of a tree sequence's tables"""
+    digest = hashlib.sha256()
+
+    def update(key, value):
+        digest.update(key.encode())
+        if isinstance(value, dict):
+            for k in sorted(value):
+                update(k, value[k])
+        elif isinstance(value, np.ndarray):
+            digest.update(f"{value.dtype.str}{value.shape}".encode())
+            digest.update(np.ascontiguousarray(value).data)
+        else:
+            digest.update(repr(value).encode())
+
+    update("tables", ts.tables.asdict())
+    return digest.hexdigest()
+
+
+def _evict_from_cache(cache_dir, cache_size, keep):
+    """Removes the least recently used cache entries until cache_dir is within cache_size bytes
+
+    The entry at path keep (the one just used) is never removed.
+    """
+
+    entries = []
+    for ts_key in os.listdir(cache_dir):
+        ts_dir = os.path.join(cache_dir, ts_key)
+        if ts_key.startswith(".") or not os.path.isdir(ts_dir):
+            continue
+        for options_key in os.listdir(ts_dir):
+            entry = os.path.join(ts_dir, options_key)
+            size = sum(f.stat().st_size for f in os.scandir(entry))
+            entries.append((os.stat(entry).st_mtime, size, entry))
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries):
+        if total <= cache_size:
+            break
+        if entry != keep:
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            try:
+                os.rmdir(os.path.dirname(entry))  # only succeeds once the tree sequence has no entries left
+            except OSError:
+                pass
+
+
+def _add_to_cache(d3arg, cache_dir, entry, cache_size):
+    """Stores a converted D3ARG at the cache entry path, then evicts old entries"""
+    os.makedirs(os.path.dirname(entry), exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=".tmp", dir=cache_dir)
+    _write_d3arg(d3arg, tmp)
+    try:
+        os.replace(tmp, entry)  # atomic, so readers never see a partly written entry
+    except OSError:
+        # Another process stored the same conversion first
+        shutil.rmtree(tmp, ignore_errors=True)
+    _evict_from_cache(cache_dir, cache_size, keep=entry)
+
+
 class D3ARG:
     """Stores the ARG in a D3.js friendly format ready for plotting
 
@@ -289,6 +1580,9 @@ class D3ARG:
     from_json(json)
         Creates a D3ARG from a saved custom JSON
 
+    load(path)
+        Loads a D3ARG saved with D3ARG.save(path)
+
     Methods
     -------
     draw(
@@ -343,13 +1637,28 @@ class D3ARG:
         self.sample_order = sample_order
         self.default_node_style = default_node_style
         self.time_units = time_units
+        self._adjacency = None
+        self._adjacency_tables = (None, None)
+        self._merge_hierarchy = None
+        self._merge_hierarchy_tables = (None, None)
 
     def __str__(self):
         """Prints attributes of D3ARG object"""
         return f"Nodes:\n{self.nodes}\n\nEdges:\n{self.edges}\n\nMutations:\n{self.mutations}\n\nBreakpoints:\n{self.breakpoints}\n\nNumber of Samples: {self.num_samples}\nSample Order: {self.sample_order}\nDefault Node Style: {self.default_node_style}"
         
     @classmethod
-    def from_ts(cls, ts, ignore_unattached_nodes=False, progress=None, default_node_style=None):
+    def from_ts(
+            cls,
+            ts,
+            ignore_unattached_nodes=False,
+            progress=None,
+            default_node_style=None,
+            random_seed=None,
+            interval=None,
+            time_window=None,
+            cache_dir=None,
+            cache_size=2**30,
+        ):
         """Converts a tskit tree sequence into a D3ARG object
         
         Parameters
@@ -361,20 +1670,46 @@ class D3ARG:
             Whether to include all nodes or ignore nodes that are completely
             unattached. Default is False.
         progress : bool
-            Show progress bars during conversion
+            Deprecated, and has no effect: conversion is vectorized and progress bars were
+            removed. A true value raises a DeprecationWarning.
         default_node_style : dict
             Customizable node stylings that will be set as default. Options include size, symbol, fill, stroke, and stroke_width
-        
+        random_seed : int or numpy.random.Generator
+            Seed used when randomly placing mutations with unknown times along their edge.
+            (default=None, uses fresh entropy)
+        interval : list(float, float) or list of lists
+            Genomic interval, or list of non-overlapping intervals, to convert. Only edges
+            overlapping the intervals are included (clipped to them), along with the nodes they
+            connect, the samples, and the sites and trees within the intervals. Scaled positions
+            ("region_fraction", "position_01", "x_pos_01", "width_01") are relative to the
+            intervals placed end to end. (default=None, the whole sequence)
+        time_window : list(float, float)
+            The (t_min, t_max) times to keep, inclusive. Either side can be None to leave it open.
+            Nodes outside of the window are dropped and links crossing its boundary become
+            truncated stubs (see D3ARG.draw()). (default=None, all times)
+        cache_dir : str
+            Directory in which to cache conversions. The result is stored under a hash of the
+            tree sequence's tables and the other parameters, and later calls with the same
+            tree sequence and parameters load it instead of converting again. Entries written by
+            another version of tskit_arg_visualizer are not used. A random_seed of
+            None is cached like any other value, so reuses the first placement of mutations with
+            unknown times; conversions with a numpy.random.Generator are never cached. See
+            D3ARG.clear_cache() to remove entries. (default=None, no caching)
+        cache_size : int
+            Maximum total size of cache_dir in bytes. The least recently used entries are removed
+            once it is exceeded. (default=2**30, 1 GiB)
+
         Returns
         -------
         D3ARG : a corresponding D3ARG object ready to be plotted
         """
         if progress:
-            from tqdm.auto import tqdm  # import here to avoid TqdmMonitorWarning on JLite
-            progressbar = tqdm
-        else:
-            progressbar = None
-
+            warnings.warn(
+                "The progress parameter of D3ARG.from_ts() is deprecated and has no effect, "
+                "as progress bars were removed.",
+                DeprecationWarning,
+                stacklevel=2,
+            )
         nsd = {
             "size": 150,
             "symbol": "d3.symbolCircle",
@@ -386,37 +1721,75 @@ class D3ARG:
             for k, v in default_node_style.items():
                 nsd[k] = v
 
-        in_edges = np.unique(np.append(ts.edges_parent, ts.edges_child))
-        samples = []
-        order = ts.first().nodes(order="minlex_postorder")
-        for n in order:
-            if ts.node(n).is_sample():
-                if ignore_unattached_nodes and n not in in_edges:
-                    continue
-                samples.append(n)
-        rcnm = np.where(ts.nodes_flags & msprime.NODE_IS_RE_EVENT)[0][1::2]
+        intervals = _check_intervals(interval, ts.sequence_length)
+        time_window = _check_time_window(time_window)
+        cache_entry = None
+        if (cache_dir is not None) and not isinstance(random_seed, np.random.Generator):
+            # The package version is part of the key, as upgrades can change the conversion
+            options = json.dumps(
+                [_STORAGE_VERSION, _package_version(), ignore_unattached_nodes, nsd, random_seed,
+                 None if intervals is None else intervals.tolist(), time_window],
+                default=repr,
+            )
+            cache_entry = os.path.join(cache_dir, _hash_tables(ts), hashlib.sha256(options.encode()).hexdigest())
+            if os.path.exists(os.path.join(cache_entry, "meta.json")):
+                os.utime(cache_entry)  # marks the entry as recently used
+                return cls(**_read_d3arg(cache_entry))
+        rcnm = np.where(ts.nodes_flags & _NODE_IS_RE_EVENT)[0][1::2]
         edges, mutations = cls._convert_edges_table(
             ts=ts,
             recombination_nodes_to_merge=rcnm,
-            progressbar=progressbar,
+            rng=np.random.default_rng(random_seed),
+            intervals=intervals,
         )
         nodes = cls._convert_nodes_table(
             ts=ts,
             recombination_nodes_to_merge=rcnm,
             default_node_style=nsd,
             ignore_unattached_nodes=ignore_unattached_nodes,
-            progressbar=progressbar)
+            intervals=intervals,
+        )
+        order = _minlex_postorder(ts.first() if intervals is None else ts.at(intervals[0, 0]))
+        included = np.zeros(ts.num_nodes, dtype=bool)
+        included[nodes["id"].to_numpy()] = True
+        use = included[order] & ((ts.nodes_flags[order] & tskit.NODE_IS_SAMPLE) != 0)
+        samples = order[use].tolist()
         time_units = ts.time_units
-        return cls(
+        arg = cls(
             nodes=nodes,
             edges=edges,
             mutations=mutations,
-            breakpoints=cls._identify_breakpoints(ts=ts),
+            breakpoints=cls._identify_breakpoints(ts=ts, intervals=intervals),
             num_samples=len(samples),
             sample_order=samples,
             default_node_style=nsd,
             time_units=time_units
         )
+        if time_window is not None:
+            arg = arg._restrict_to_time_window(time_window)
+        if cache_entry is not None:
+            _add_to_cache(arg, cache_dir, cache_entry, cache_size)
+        return arg
+
+    @staticmethod
+    def clear_cache(cache_dir, ts=None):
+        """Removes conversions cached by D3ARG.from_ts(..., cache_dir=cache_dir)
+
+        Parameters
+        ----------
+        cache_dir : str
+            The cache directory
+        ts : tskit.TreeSequence
+            Only remove the conversions of this tree sequence. (default=None, removes all)
+        """
+        if not os.path.isdir(cache_dir):
+            return
+        if ts is None:
+            keys = [k for k in os.listdir(cache_dir) if (len(k) == 64) or k.startswith(".tmp")]
+        else:
+            keys = [_hash_tables(ts)]
+        for key in keys:
+            shutil.rmtree(os.path.join(cache_dir, key), ignore_errors=True)
     
     @classmethod
     def from_json(cls, json):
@@ -433,27 +1806,67 @@ class D3ARG:
         D3ARG : a corresponding D3ARG object ready to be plotted
         """
 
+        data = json["data"]
+        return cls._from_json_tables(
+            json,
+            nodes=pd.DataFrame(data["nodes"]),
+            edges=pd.DataFrame(data["links"]),
+            mutations=pd.DataFrame(data["mutations"]),
+            breakpoints=pd.DataFrame(data["breakpoints"]),
+        )
+
+    @classmethod
+    def from_json_file(cls, path):
+        """Reads a saved custom JSON file into the D3ARG object
+
+        Equivalent to D3ARG.from_json(json.load(open(path))), but the tables are read
+        incrementally straight into columns, so that peak memory stays close to the size
+        of the final tables rather than several times the size of the file.
+
+        Parameters
+        ----------
+        path : str
+            Path to the JSON file downloaded from the visualizer
+
+        Returns
+        -------
+        D3ARG : a corresponding D3ARG object ready to be plotted
+        """
+
+        with open(path, "r", encoding="utf-8") as f:
+            meta, tables = _read_argviz_json(f)
+        return cls._from_json_tables(
+            meta,
+            nodes=pd.DataFrame(tables.get("nodes", {})),
+            edges=pd.DataFrame(tables.get("links", {})),
+            mutations=pd.DataFrame(tables.get("mutations", {})),
+            breakpoints=pd.DataFrame(tables.get("breakpoints", {})),
+        )
+
+    @classmethod
+    def _from_json_tables(cls, json, nodes, edges, mutations, breakpoints):
+        """Builds the D3ARG from the tables and top level values of a saved custom JSON"""
         width = json["width"]
         x_shift = 50
         if json["y_axis"]["include_labels"]:
             x_shift = 100
             width -= 50
-        nodes = pd.DataFrame(json["data"]["nodes"])
         nodes["x_pos_01"] = (nodes["x"] - x_shift) / (width-100)
         if json["plot_type"] == "full":
-            samples = nodes.loc[(nodes["ts_flags"] & tskit.NODE_IS_SAMPLE) != 0,["id", "fx"]]
-            num_samples = samples.shape[0]
-            sample_order = [sample for _, sample in sorted(zip(samples["fx"], samples["id"]))]
+            is_sample = (nodes["ts_flags"].to_numpy() & tskit.NODE_IS_SAMPLE) != 0
+            ids = nodes["id"].to_numpy()[is_sample]
+            num_samples = len(ids)
+            sample_order = ids[np.lexsort((ids, nodes["fx"].to_numpy()[is_sample]))].tolist()
         else:
             num_samples = -1
             sample_order = []
-        mutations = pd.DataFrame(json["data"]["mutations"])
-        # ensure the time column is float (in case it is full of None values)
-        mutations["time"] = mutations["time"].astype(np.float64)
-        # ensure that NaNs are set to the special unknown time value. This requires
-        # some care to ensure that the NaNs are not cast before setting (e.g. can't use fillna)
-        unknown = np.isnan(mutations.time)
-        mutations.loc[unknown, "time"] = np.full_like(len(unknown), tskit.UNKNOWN_TIME, dtype=np.float64)
+        if "time" in mutations:  # no columns if the plot had no mutations
+            # ensure the time column is float (in case it is full of None values)
+            mutations["time"] = mutations["time"].astype(np.float64)
+            # ensure that NaNs are set to the special unknown time value. This requires
+            # some care to ensure that the NaNs are not cast before setting (e.g. can't use fillna)
+            unknown = np.isnan(mutations.time)
+            mutations.loc[unknown, "time"] = np.full_like(len(unknown), tskit.UNKNOWN_TIME, dtype=np.float64)
         if "units" in json["y_axis"]:
             time_units = json["y_axis"]["units"]
         else:
@@ -461,16 +1874,49 @@ class D3ARG:
             time_units = None
         return cls(
             nodes=nodes,
-            edges=pd.DataFrame(json["data"]["links"]),
+            edges=edges,
             mutations=mutations,
-            breakpoints=pd.DataFrame(json["data"]["breakpoints"]),
+            breakpoints=breakpoints,
             num_samples=num_samples,
             sample_order=sample_order,
             default_node_style=json["default_node_style"],
             time_units=time_units
         )
 
-    def _convert_nodes_table(ts, recombination_nodes_to_merge, default_node_style, ignore_unattached_nodes, progressbar=None):
+    def save(self, path):
+        """Saves the D3ARG in a compact binary format, to be read with D3ARG.load()
+
+        The tables are stored column by column as .npy files in a directory. Numeric columns
+        are stored as they are, string columns as codes into their distinct values, and list
+        columns (such as "child_of") as offsets + values.
+
+        Parameters
+        ----------
+        path : str
+            Directory to save into. It is created if needed, and a previous save in it is replaced.
+        """
+        _write_d3arg(self, path)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Loads a D3ARG saved with D3ARG.save()
+
+        Parameters
+        ----------
+        path : str
+            Directory that the D3ARG was saved into
+        mmap : bool
+            Whether to memory-map the numeric columns rather than reading them into memory, so
+            that they are only read from disk when used. Changes made to the loaded D3ARG are
+            never written back to disk. (default=True)
+
+        Returns
+        -------
+        D3ARG : the saved D3ARG object
+        """
+        return cls(**_read_d3arg(path, mmap_mode="c" if mmap else None))
+
+    def _convert_nodes_table(ts, recombination_nodes_to_merge, default_node_style, ignore_unattached_nodes, intervals=None):
         """Creates nodes JSON from the tskit.TreeSequence nodes table
         
         A "reference" is the id of another node that is used to determine a property in the
@@ -490,62 +1936,66 @@ class D3ARG:
         ignore_unattached_nodes : bool
             Whether to include all nodes or ignore nodes that are completely
             unattached
-        progressbar : 
-            A function like tqdm.auto.tqdm for showing progress bars.
+        intervals : numpy.Array
+            Genomic intervals to restrict to, from _check_intervals(). If given, only
+            the nodes attached to edges in the intervals (and samples, unless
+            ignore_unattached_nodes) are included. (default=None, whole sequence)
 
         Returns
         -------
-        nodes : list
-            List of dictionaries containing information about a given node
+        nodes : pd.DataFrame
+            One row per plotted node. Default style columns are broadcast across all rows.
         """
-        if not progressbar:
-            progressbar = lambda x, **kwargs: x
         nodes_flags = ts.nodes_flags
-        node_lookup = np.arange(ts.num_nodes)  # maps original node IDs to the plotted node ID
+        is_re_node = (nodes_flags & _NODE_IS_RE_EVENT) != 0
+        node_lookup = np.arange(ts.num_nodes, dtype=np.int64)  # maps original node IDs to the plotted node ID
         merge_with_prev_node = np.zeros(ts.num_nodes, dtype=bool)
         merge_with_prev_node[recombination_nodes_to_merge] = True
-        merge_with_prev_node = np.logical_and(merge_with_prev_node, nodes_flags & msprime.NODE_IS_RE_EVENT != 0)
-        node_lookup[merge_with_prev_node] = node_lookup[merge_with_prev_node] - 1  # plotted ID is ID of prev node
-
-        if ignore_unattached_nodes:
-            omit_nodes = np.ones(ts.num_nodes, dtype=bool)
-            omit_nodes[ts.edges_parent] = False
-            omit_nodes[ts.edges_child] = False
-
-        nodes = {
-            u: (default_node_style | {
-                "id": u,
-                "ts_flags": flags,
-                "time": time,
-                "child_of": set(),  # will later convert to list
-                "parent_of": set(),  # will later convert to list
-                "x_pos_reference": -1,
-            })
-            for u, (flags, time) in enumerate(zip(nodes_flags, ts.nodes_time))
-            if not (ignore_unattached_nodes and omit_nodes[u]) and not merge_with_prev_node[u]
-        }
-
-        for child, parent in zip(ts.edges_child, ts.edges_parent):
-            nodes[node_lookup[child]]['child_of'].add(int(node_lookup[parent]))
-            nodes[node_lookup[parent]]['parent_of'].add(int(node_lookup[child]))
-
-        for u in progressbar(nodes.keys(), desc="Nodes"):
-            info = nodes[u]
-            info['child_of'] = sorted(info['child_of'])
-            info['parent_of'] = unique_parent_of = sorted(info['parent_of'])
-
-            if info["ts_flags"] == 131072:
-                info["label"] = str(u)+"/"+str(u+1)
-                if (len(unique_parent_of) == 1) and not (nodes_flags[unique_parent_of[0]] & msprime.NODE_IS_RE_EVENT != 0):
-                    info["x_pos_reference"] = unique_parent_of[0]
-            else:
-                info["label"] = str(u)
-                if (len(unique_parent_of) == 1) and (len(info['child_of']) > 0):
-                    # ignores roots as that is necessary to avoid stacking
-                    info["x_pos_reference"] = unique_parent_of[0]
-        return pd.DataFrame(nodes.values())
-
-    def _convert_edges_table(ts, recombination_nodes_to_merge, progressbar=None):
+        merge_with_prev_node = np.logical_and(merge_with_prev_node, is_re_node)
+        node_lookup[merge_with_prev_node] -= 1  # plotted ID is ID of prev node
+
+        edge_index, _, _ = _clip_to_intervals(ts.edges_left, ts.edges_right, intervals)
+        child = node_lookup[ts.edges_child[edge_index]]
+        parent = node_lookup[ts.edges_parent[edge_index]]
+
+        keep = ~merge_with_prev_node
+        if ignore_unattached_nodes or (intervals is not None):
+            attached = np.zeros(ts.num_nodes, dtype=bool)
+            attached[parent] = True
+            attached[child] = True
+            if not ignore_unattached_nodes:
+                attached |= (nodes_flags & tskit.NODE_IS_SAMPLE) != 0
+            keep &= attached
+        ids = np.flatnonzero(keep)
+
+        # Unique plotted (child, parent) pairs, sorted one way for child_of and the other for parent_of
+        pairs = np.unique(child * ts.num_nodes + parent)
+        child_of, num_parents, _ = _group_sorted_pairs(pairs // ts.num_nodes, pairs % ts.num_nodes, ids)
+        pairs = np.unique(parent * ts.num_nodes + child)
+        parent_of, num_children, only_child = _group_sorted_pairs(pairs // ts.num_nodes, pairs % ts.num_nodes, ids)
+
+        flags = nodes_flags[ids]
+        is_recombination = flags == _NODE_IS_RE_EVENT
+        single_child = num_children == 1
+        # ignores roots as that is necessary to avoid stacking
+        use_reference = np.where(
+            is_recombination,
+            single_child & ~is_re_node[np.maximum(only_child, 0)],
+            single_child & (num_parents > 0),
+        )
+        labels = ids.astype(str).astype(object)
+        labels[is_recombination] = labels[is_recombination] + "/" + (ids[is_recombination] + 1).astype(str)
+        return pd.DataFrame(default_node_style | {
+            "id": ids,
+            "ts_flags": flags,
+            "time": ts.nodes_time[ids],
+            "child_of": child_of,
+            "parent_of": parent_of,
+            "x_pos_reference": np.where(use_reference, only_child, -1),
+            "label": labels,
+        })
+
+    def _convert_edges_table(ts, recombination_nodes_to_merge, rng=None, intervals=None):
         """Creates edges JSON from the tskit.TreeSequence edges table
 
         Merges the recombination nodes, identified by the smaller of the two IDs. The direction
@@ -560,139 +2010,172 @@ class D3ARG:
             msprime.sim_ancestry(...,record_full_arg=True)
         recombination_nodes_to_merge : list or numpy.Array
             IDs of recombination nodes that need to be converted to their alternate ID
-        progressbar :
-            A function like tqdm.auto.tqdm for showing progress bars.
+        rng : numpy.random.Generator
+            Used to place mutations with unknown times along their edge
+        intervals : numpy.Array
+            Genomic intervals to restrict to, from _check_intervals(). Edges are clipped
+            to the intervals and those outside of them are dropped. (default=None, whole sequence)
             
         Returns
         -------
-        links : list
-            List of dictionaries containing information about a given link
+        links : pd.DataFrame
+            One row per link, in order of the first tskit edge of each link
+        mutations : pd.DataFrame
+            One row per plotted mutation, with the ID of the link it sits on
         """
-        if not progressbar:
-            progressbar = lambda x, **kwargs: x
-        ID = 0
-        edge_id_reference = {}
-        links = []  # a list of parent_links (will be flattened and returned as a pandas array)
         nodes_time = ts.nodes_time
         nodes_flags = ts.nodes_flags
-        edges_child = ts.edges_child
-        edges_parent = ts.edges_parent
-        # iterate over unique parent/child combos. Take advantage of the fact that edges
-        # in a tree sequence are always ordered by parent ID.
-
-        for parent, edges in progressbar(
-            itertools.groupby(ts.edges(), operator.attrgetter("parent")),
-            total=len(set(edges_parent)),
-            desc="Edge parents",
-        ):
-            parent_time = nodes_time[parent]
-            parent_links = []  # all links for this parent
-            if parent in recombination_nodes_to_merge:
-                parent -= 1
-                ID = links[-1][0]["id"]  # to account for prev parent_links being overwritten
-            else:
-                edges_for_child = {}  # This is a new parent: make a new array
-            for edge in edges:
-                if edge.child not in edges_for_child:
-                    edges_for_child[edge.child] = [edge]
-                else:
-                    edges_for_child[edge.child].append(edge)
-            
-            children = np.array(list(edges_for_child.keys()))
-            for child, equivalent_edges in edges_for_child.items():
-                child_time = nodes_time[child]
-                region_size = 0
-                bounds = ""
-                alternative_child = -1
-                alternative_parent = -1
-                if (nodes_flags[parent] & msprime.NODE_IS_RE_EVENT) == 0:
-                    if len(children) > 2:
-                        alternative_child = children[children != child][0]
-                    elif len(children) > 1:
-                        alternative_child = children[children != child][0]
-                    else:
-                        alternative_child = -1 # this occurs when converting from SLiM simulations, needs to have better handling
-                    if alternative_child in recombination_nodes_to_merge:
-                        alternative_child -= 1
-                if (nodes_flags[child] & msprime.NODE_IS_RE_EVENT) != 0:
-                    if child in recombination_nodes_to_merge:
-                        alt_id = child - 1
-                    else:
-                        alt_id = child + 1
-                    alt_id_parents = edges_parent[edges_child == alt_id]
-                    if len(alt_id_parents):
-                        alternative_parent = alt_id_parents[0]
-                    else:
-                        alternative_parent = -1
-                if child in recombination_nodes_to_merge:
-                    child = child - 1
-                for edge in equivalent_edges:
-                    edge_id_reference[edge.id] = (ID, parent, child, parent_time, child_time)
-                    bounds += f"{edge.left}-{edge.right} "
-                    region_size += edge.right - edge.left
-                parent_links.append({
-                    "id": ID,
-                    "source": parent,
-                    "source_time": parent_time,
-                    "target": child,
-                    "target_time": child_time,
-                    "bounds": bounds[:-1],
-                    "alt_parent": alternative_parent, #recombination nodes have an alternative parent
-                    "alt_child": alternative_child,
-                    "region_fraction": region_size / ts.sequence_length,
-                    "stroke": "#053e4e",
-                })
-                ID += 1
-            if edge.parent in recombination_nodes_to_merge:
-                # We must replace the previous parent_links array with all the details from this one,
-                # which will contain all edges for both recombination parents
-                links[-1] = parent_links
-            else:
-                links.append(parent_links)
-        edges_output = pd.DataFrame(l for parent_links in links for l in parent_links)
-        mutations = []
-        for site in progressbar(
-            ts.sites(),
-            total=ts.num_sites,
-            desc="Sites",
-            disable=ts.num_sites == 0
-        ):
-            for mut in site.mutations:
-                if mut.edge != tskit.NULL:  # mutations e.g. above a root are currently not plotted
-                    new_edge = edge_id_reference[mut.edge]
-                    mut_time = mut.time
-                    if (tskit.is_unknown_time(mut_time)):
-                        # Hacky way of placing mutations with unknown times randomly along
-                        # an edge. Essentially, giving them a false time just for plotting.
-                        middle = (new_edge[3] + new_edge[4]) / 2
-                        plot_time = middle + random.uniform(-(new_edge[3]-middle),(new_edge[3]-middle))
-                        fill = default_mutation_styles["unknown_time"]["fill"]
-                        stroke = default_mutation_styles["unknown_time"]["stroke"]
-                    else:
-                        plot_time = mut.time
-                        fill = default_mutation_styles["known_time"]["fill"]
-                        stroke = default_mutation_styles["known_time"]["stroke"]
-                    inherited_state = site.ancestral_state if mut.parent == tskit.NULL else ts.mutation(mut.parent).derived_state
-                    mutations.append({
-                        "edge": new_edge[0],
-                        "source": new_edge[1],
-                        "target": new_edge[2],
-                        "time": mut_time,
-                        "plot_time": plot_time,
-                        "site_id": site.id,
-                        "position": site.position,
-                        "position_01": site.position/ts.sequence_length,
-                        "ancestral": site.ancestral_state,
-                        "inherited": inherited_state,
-                        "derived": mut.derived_state,
-                        "fill": fill,
-                        "stroke": stroke,
-                        "size": default_mutation_styles["size"],
-                    })
-        mutations_output = pd.DataFrame(mutations, columns=["edge","source","target","time","plot_time","site_id","position","position_01","ancestral","inherited","derived","fill","stroke","size"])
+        edge_index, edges_left, edges_right = _clip_to_intervals(ts.edges_left, ts.edges_right, intervals)
+        edges_parent = ts.edges_parent[edge_index].astype(np.int64)
+        edges_child = ts.edges_child[edge_index].astype(np.int64)
+        is_re_node = (nodes_flags & _NODE_IS_RE_EVENT) != 0
+        merge_with_prev_node = np.zeros(ts.num_nodes, dtype=bool)
+        merge_with_prev_node[recombination_nodes_to_merge] = True
+        node_lookup = np.arange(ts.num_nodes, dtype=np.int64)
+        node_lookup[merge_with_prev_node] -= 1
+
+        # One link per (plotted parent, original child) pair. Edges in a tree sequence are
+        # sorted by parent time and ID, so both halves of a recombination node pair are
+        # adjacent and ordering links by first appearance keeps the parents contiguous.
+        plotted_parent = node_lookup[edges_parent]
+        _, first_edge, inverse = np.unique(
+            plotted_parent * ts.num_nodes + edges_child, return_index=True, return_inverse=True
+        )
+        link_order = np.argsort(first_edge, kind="stable")
+        first_edge = first_edge[link_order]
+        link_rank = np.empty_like(link_order)
+        link_rank[link_order] = np.arange(len(link_order))
+        piece_link = link_rank[inverse.reshape(-1)]
+        edge_link = np.full(ts.num_edges, tskit.NULL, dtype=np.int64)  # link ID of every tskit edge
+        edge_link[edge_index] = piece_link
+        num_links = len(first_edge)
+
+        link_parent = plotted_parent[first_edge]
+        link_child = edges_child[first_edge]
+
+        # Alternative child: the first other child of the same (non-recombination) parent
+        new_parent = np.ones(num_links, dtype=bool)
+        new_parent[1:] = link_parent[1:] != link_parent[:-1]
+        run_start = np.flatnonzero(new_parent)
+        run_length = np.diff(np.append(run_start, num_links))
+        run_of_link = np.cumsum(new_parent) - 1
+        has_second = run_length > 1
+        run_second_child = np.full(len(run_start), -1, dtype=np.int64)
+        run_second_child[has_second] = link_child[run_start[has_second] + 1]
+        first_child = link_child[run_start][run_of_link]
+        second_child = run_second_child[run_of_link]
+        alt_child = np.where(link_child == first_child, second_child, first_child)
+        alt_child[is_re_node[link_parent]] = -1
+        alt_child[alt_child != -1] = node_lookup[alt_child[alt_child != -1]]
+
+        # Alternative parent: the first parent of the other half of a recombination node pair
+        first_parent_of = np.full(ts.num_nodes + 1, -1, dtype=np.int64)
+        children, first_as_child = np.unique(edges_child, return_index=True)
+        first_parent_of[children] = edges_parent[first_as_child]
+        alt_parent = np.full(num_links, -1, dtype=np.int64)
+        re_child = is_re_node[link_child]
+        alt_id = np.where(merge_with_prev_node[link_child], link_child - 1, link_child + 1)
+        alt_parent[re_child] = first_parent_of[alt_id[re_child]]
+
+        bounds, region_size = _merge_edge_intervals(
+            edge_link=piece_link,
+            left=edges_left,
+            right=edges_right,
+            num_links=num_links,
+        )
+        link_target = node_lookup[link_child]
+        link_parent_time = nodes_time[edges_parent[first_edge]]
+        link_child_time = nodes_time[link_child]
+        edges_output = pd.DataFrame({
+            "id": np.arange(num_links, dtype=np.int64),
+            "source": link_parent,
+            "source_time": link_parent_time,
+            "target": link_target,
+            "target_time": link_child_time,
+            "bounds": bounds,
+            "alt_parent": alt_parent, #recombination nodes have an alternative parent
+            "alt_child": alt_child,
+            "region_fraction": region_size / _total_length(intervals, ts.sequence_length),
+            "stroke": "#053e4e",
+        })
+        mutations_output = D3ARG._convert_mutations_table(
+            ts=ts,
+            edges=edges_output,
+            edge_link=edge_link,
+            rng=rng,
+            intervals=intervals,
+        )
         return edges_output, mutations_output
+
+    def _convert_mutations_table(ts, edges, edge_link, rng=None, intervals=None):
+        """Creates mutations JSON from the tskit.TreeSequence mutations and sites tables
+
+        Mutations that are not above an edge (e.g. above a root) are currently not plotted.
+
+        Parameters
+        ----------
+        ts : tskit.TreeSequence
+        edges : pd.DataFrame
+            Links created by _convert_edges_table()
+        edge_link : numpy.Array
+            The link ID of each tskit edge
+        rng : numpy.random.Generator
+            Used to place mutations with unknown times along their edge
+        intervals : numpy.Array
+            Genomic intervals to restrict to, from _check_intervals(). (default=None, whole sequence)
+
+        Returns
+        -------
+        mutations : pd.DataFrame
+            One row per plotted mutation, with the ID of the link it sits on
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+        tables = ts.tables
+        ancestral_states = _unpack_ragged_strings(tables.sites.ancestral_state, tables.sites.ancestral_state_offset)
+        derived_states = _unpack_ragged_strings(tables.mutations.derived_state, tables.mutations.derived_state_offset)
+        mutations_parent = tables.mutations.parent
+        mutations_site = tables.mutations.site
+        inherited_states = ancestral_states[mutations_site]
+        has_parent = mutations_parent != tskit.NULL
+        inherited_states[has_parent] = derived_states[mutations_parent[has_parent]]
+
+        plotted = ts.mutations_edge != tskit.NULL
+        if intervals is not None:
+            plotted &= _in_intervals(ts.sites_position[mutations_site], intervals)
+        plotted = np.flatnonzero(plotted)
+        link = edge_link[ts.mutations_edge[plotted]]
+        site = mutations_site[plotted].astype(np.int64)
+        position = ts.sites_position[site]
+        source_time = edges["source_time"].to_numpy()[link]
+        target_time = edges["target_time"].to_numpy()[link]
+        time = tables.mutations.time[plotted]
+        unknown = tskit.is_unknown_time(time)
+        # Hacky way of placing mutations with unknown times randomly along
+        # an edge. Essentially, giving them a false time just for plotting.
+        middle = (source_time[unknown] + target_time[unknown]) / 2
+        half_length = source_time[unknown] - middle
+        plot_time = time.copy()
+        plot_time[unknown] = middle + rng.uniform(-half_length, half_length)
+        styles = [default_mutation_styles["known_time"], default_mutation_styles["unknown_time"]]
+        return pd.DataFrame({
+            "edge": link,
+            "source": edges["source"].to_numpy()[link],
+            "target": edges["target"].to_numpy()[link],
+            "time": time,
+            "plot_time": plot_time,
+            "site_id": site,
+            "position": position,
+            "position_01": _window_position(position, intervals) / _total_length(intervals, ts.sequence_length),
+            "ancestral": ancestral_states[site],
+            "inherited": inherited_states[plotted],
+            "derived": derived_states[plotted],
+            "fill": np.where(unknown, styles[1]["fill"], styles[0]["fill"]).astype(object),
+            "stroke": np.where(unknown, styles[1]["stroke"], styles[0]["stroke"]).astype(object),
+            "size": default_mutation_styles["size"],
+        })
    
-    def _identify_breakpoints(ts):
+    def _identify_breakpoints(ts, intervals=None):
         """Creates breakpoints JSON from the tskit.TreeSequence
 
         Parameters
@@ -700,31 +2183,87 @@ class D3ARG:
         ts : tskit.TreeSequence
             tree sequence must have marked recombination nodes, such as using
             msprime.sim_ancestry(...,record_full_arg=True)
+        intervals : numpy.Array
+            Genomic intervals to restrict to, from _check_intervals(). Trees are clipped
+            to the intervals. (default=None, whole sequence)
         
         Returns
         -------
-        breakpoints : list
-            List of dictionaries containing information about breakpoints
+        breakpoints : pd.DataFrame
+            One row per tree, with a categorical fill column
         """
         
-        breakpoints = []
-        start = 0
-        id = 0
-        for bp in ts.breakpoints():
-            bp = float(bp)
-            if bp != 0:
-                breakpoints.append({
-                    "id": id,
-                    "start": start,
-                    "stop": bp,
-                    "x_pos_01":(start/ts.sequence_length),
-                    "width_01":((bp - start)/ts.sequence_length),
-                    "fill":"#053e4e"
-                })
-                start = bp
-                id += 1
-        return pd.DataFrame(breakpoints)
+        bps = ts.breakpoints(as_array=True)
+        _, start, stop = _clip_to_intervals(bps[:-1], bps[1:], intervals)
+        total_length = _total_length(intervals, ts.sequence_length)
+        return pd.DataFrame({
+            "id": np.arange(len(start), dtype=np.int64),
+            "start": start,
+            "stop": stop,
+            "x_pos_01": _window_position(start, intervals) / total_length,
+            "width_01": (stop - start) / total_length,
+            "fill": pd.Categorical.from_codes(np.zeros(len(start), dtype=np.int8), categories=["#053e4e"]),
+        })
     
+    @property
+    def adjacency(self):
+        """The AdjacencyIndex of the current nodes and edges tables
+
+        Built on first use and kept until either table is replaced. Changing
+        the "id", "source" or "target" columns in place is not detected.
+        """
+        nodes, edges = self._adjacency_tables
+        if (self._adjacency is None) or (nodes is not self.nodes) or (edges is not self.edges):
+            self._adjacency = AdjacencyIndex.from_tables(self.nodes, self.edges)
+            self._adjacency_tables = (self.nodes, self.edges)
+        return self._adjacency
+
+    @property
+    def merge_hierarchy(self):
+        """The MergeHierarchy that draw(zoom=...) uses for the current nodes and edges tables
+
+        Built on first use and kept until either table is replaced, like adjacency.
+        """
+        nodes, edges = self._merge_hierarchy_tables
+        if (self._merge_hierarchy is None) or (nodes is not self.nodes) or (edges is not self.edges):
+            self._merge_hierarchy = MergeHierarchy.from_tables(self.nodes, self.edges)
+            self._merge_hierarchy_tables = (self.nodes, self.edges)
+        return self._merge_hierarchy
+
+    def parents_of(self, ids):
+        """Finds the parents of one or more nodes
+
+        Parameters
+        ----------
+        ids : int or list or np.array
+            IDs of the nodes
+
+        Returns
+        -------
+        parents : np.array
+            Sorted IDs of all of the nodes that are a parent of any given node
+        """
+
+        rows = self.adjacency.parent_links(ids)
+        return np.unique(self.edges["source"].to_numpy(dtype=np.int64)[rows])
+
+    def children_of(self, ids):
+        """Finds the children of one or more nodes
+
+        Parameters
+        ----------
+        ids : int or list or np.array
+            IDs of the nodes
+
+        Returns
+        -------
+        children : np.array
+            Sorted IDs of all of the nodes that are a child of any given node
+        """
+
+        rows = self.adjacency.child_links(ids)
+        return np.unique(self.edges["target"].to_numpy(dtype=np.int64)[rows])
+
     def set_node_labels(self, labels):
         """Sets custom node labels
 
@@ -752,7 +2291,7 @@ class D3ARG:
         """Resets node labels to default (based on msprime IDs)"""
 
         for node in self.nodes:
-            if node["ts_flags"] == msprime.NODE_IS_RE_EVENT:
+            if node["ts_flags"] == _NODE_IS_RE_EVENT:
                 node["label"] = str(node["id"]) + "/" + str(node["id"]+1)
             else:
                 node["label"] = str(node["id"])
@@ -893,7 +2432,9 @@ class D3ARG:
     def reset_all_breakpoint_fills(self):
         """Sets the fill of genome bar blocks to the specified color"""
 
-        self.breakpoints["fill"] = "#053e4e"
+        self.breakpoints["fill"] = pd.Categorical.from_codes(
+            np.zeros(len(self.breakpoints), dtype=np.int8), categories=["#053e4e"]
+        )
 
     def set_breakpoint_fills(self, colors):
         """Set the fill of each breakpoint block in the ARG
@@ -904,6 +2445,10 @@ class D3ARG:
             ID of the edge and its new color
         """
 
+        fill = self.breakpoints["fill"]
+        if isinstance(fill.dtype, pd.CategoricalDtype):
+            new_colors = [c for c in dict.fromkeys(colors.values()) if c not in fill.cat.categories]
+            self.breakpoints["fill"] = fill.cat.add_categories(new_colors)
         for id in colors:
             if id in self.breakpoints["id"].values:
                 self.breakpoints.loc[self.breakpoints["id"]==id, "fill"] = colors[id]
@@ -1018,6 +2563,9 @@ class D3ARG:
             rotate_tip_labels=False,
             preamble=None,
             save_filename=None,
+            columnar_data=False,
+            coordinate_precision=None,
+            as_records=False,
         ):
         """Creates the required JSON for both draw() and draw_node()
 
@@ -1082,6 +2630,18 @@ class D3ARG:
         save_filename : str
             Filename to use when selecting "Download as" in the visualization
             (default=None, treated as "tskit_arg_visualizer")
+        columnar_data : bool
+            Whether to embed the nodes, edges, mutations and breakpoints as one array per field,
+            with repeated strings (such as colors) stored once, rather than as one object per row.
+            This makes the output several times smaller for large graphs; the rows are rebuilt
+            in the browser. (default=False)
+        coordinate_precision : int
+            Number of decimal places to round the pixel positions of the nodes, mutations and
+            breakpoints to. (default=None, not rounded)
+        as_records : bool
+            Whether to return the tables as _JSONRecords, which draw_D3 writes straight from
+            their columns, rather than as lists of dictionaries. Ignored if columnar_data or
+            coordinate_precision are used. (default=False)
         Returns
         -------
         arg : list
@@ -1142,13 +2702,16 @@ class D3ARG:
     
         time_to_pos = {}
         y_axis_ticks = {}
+        time_ranks = {}
+        for i, time in enumerate(unique_times):
+            time_ranks.setdefault(time, i)
         for time in unique_times:
             pos = convert_time_to_position(
                 float(time),
                 min_time,
                 max_time,
                 y_axis_scale,
-                unique_times,
+                time_ranks,
                 h_spacing,
                 height,
                 y_shift
@@ -1157,9 +2720,6 @@ class D3ARG:
             if time in y_axis_labels:
                 y_axis_ticks[pos] = y_axis_labels[time]
         
-        transformed_nodes = []
-        transformed_muts = []
-        
         default_left_spacing = 50
         y_axis_left_spacing = 0
         if shift_for_y_axis:
@@ -1171,20 +2731,32 @@ class D3ARG:
         else:
             sample_positions = []
 
-        node_y_pos = {}
-        for index, node in nodes.iterrows():
-            if "x_pos_01" in node:
-                if node["x_pos_01"] != -1 and node["x_pos_01"] != np.nan:
-                    node["fx"] = node["x_pos_01"] * (width-100) + default_left_spacing + y_axis_left_spacing
-            elif (node["ts_flags"] & tskit.NODE_IS_SAMPLE) and (plot_type == "full"):
-                node["fx"] = sample_positions[sample_order.index(node["id"])]
+        # Fields are added column by column, as if to each row in turn: "fx" and "x" are
+        # only added to some rows, and are then absent from the others
+        transformed_nodes = _JSONRecords(nodes.copy(), {})
+        ids = nodes["id"].tolist()
+        if "x_pos_01" in nodes:
+            x_pos_01 = nodes["x_pos_01"].to_numpy()
+            fx = x_pos_01 * (width-100) + default_left_spacing + y_axis_left_spacing
+            _set_record_field(transformed_nodes, "fx", fx, x_pos_01 != -1)
+        else:
+            is_sample = (nodes["ts_flags"].to_numpy() & tskit.NODE_IS_SAMPLE) != 0
+            fx = np.full(len(ids), np.nan)
+            if plot_type == "full":
+                position = dict(zip(reversed(sample_order), reversed(sample_positions)))  # first wins
+                for i in np.flatnonzero(is_sample):
+                    if ids[i] not in position:
+                        raise ValueError(f"{ids[i]!r} is not in list")
+                    fx[i] = position[ids[i]]
             else:
-                node["x"] = 0.5 * (width-100) + default_left_spacing + y_axis_left_spacing
-            fy = time_to_pos[node["time"]]
-            node["fy"] = fy
-            node["y"] = node["fy"]
-            node_y_pos[node["id"]] = node["fy"] 
-            transformed_nodes.append(node.to_dict())
+                is_sample[:] = False
+            _set_record_field(transformed_nodes, "fx", fx, is_sample)
+            x = np.full(len(ids), 0.5 * (width-100) + default_left_spacing + y_axis_left_spacing)
+            _set_record_field(transformed_nodes, "x", x, ~is_sample)
+        fy = np.array([time_to_pos[t] for t in nodes["time"].tolist()], dtype=np.float64)
+        _set_record_field(transformed_nodes, "fy", fy)
+        _set_record_field(transformed_nodes, "y", fy)
+        node_y_pos = dict(zip(ids, fy.tolist()))
 
         transformed_muts = []
         if show_mutations:
@@ -1251,15 +2823,20 @@ class D3ARG:
                                     "size": mut['size'],  # can't use attribute access as "size" already exists
                                 })
                     else:
-                        for index, mut in mutations.iterrows():
-                            fy = time_to_pos[mut["plot_time"]]
-                            mut["x_pos"] = mut["position_01"] * width + y_axis_left_spacing
-                            mut["fy"] = fy
-                            mut["y"] = mut["fy"]
-                            #mut["position_index"] = mut.site_id
-                            mut["label"] = mut["inherited"] + str(int(mut["position"])) + mut["derived"]
-                            mut["content"] = mut["inherited"] + str(int(mut["position"])) + mut["derived"] #+ ":" + str(int(mut["time"]))
-                            transformed_muts.append(mut.to_dict())
+                        transformed_muts = _JSONRecords(mutations.copy(), {})
+                        x_pos = mutations["position_01"].to_numpy() * width + y_axis_left_spacing
+                        fy = np.array([time_to_pos[t] for t in mutations["plot_time"].tolist()], dtype=np.float64)
+                        label = [
+                            inherited + str(int(position)) + derived
+                            for inherited, position, derived in zip(
+                                mutations["inherited"].tolist(), mutations["position"].tolist(), mutations["derived"].tolist()
+                            )
+                        ]
+                        _set_record_field(transformed_muts, "x_pos", x_pos)
+                        _set_record_field(transformed_muts, "fy", fy)
+                        _set_record_field(transformed_muts, "y", fy)
+                        _set_record_field(transformed_muts, "label", np.array(label, dtype=object))
+                        _set_record_field(transformed_muts, "content", np.array(label, dtype=object)) #+ ":" + str(int(mut["time"]))
             else:
                 print("WARNING: `show_mutations=True` is not compatible with `edge_type='ortho'`. Please use `edge_type='line'` instead. Ignoring mutations in current plot.")
 
@@ -1289,7 +2866,7 @@ class D3ARG:
         transformed_bps["x_pos"] = transformed_bps["x_pos_01"] * width + y_axis_left_spacing
         transformed_bps["width"] = transformed_bps["width_01"] * width
         transformed_bps["included"] = True
-        transformed_bps = transformed_bps.to_dict("records")
+        transformed_bps = _JSONRecords(transformed_bps, {})
 
         if shift_for_y_axis:
             width += 100
@@ -1305,7 +2882,7 @@ class D3ARG:
         arg = {
             "data":{
                 "nodes": transformed_nodes,
-                "links": edges.to_dict("records"),
+                "links": _JSONRecords(edges, {}),
                 "mutations": transformed_muts,
                 "breakpoints": transformed_bps,
                 "evenly_distributed_positions": sample_positions,
@@ -1336,6 +2913,12 @@ class D3ARG:
             "preamble": preamble,
             "save_filename": save_filename,
         }
+        if (not as_records) or columnar_data or (coordinate_precision is not None):
+            for name, table in arg["data"].items():
+                if isinstance(table, _JSONRecords):
+                    arg["data"][name] = table.rows()
+        if columnar_data or (coordinate_precision is not None):
+            arg["data"] = _compact_data(arg["data"], columnar=columnar_data, precision=coordinate_precision)
         return arg
 
 
@@ -1347,52 +2930,133 @@ class D3ARG:
                 descendants.extend(self.get_summary_descendants(sn, summary_nodes))
             return descendants
         return [node]
-    
-    def _map_node_ids_at_zoom(self, zoom):
+
+    def _restrict_to_time_window(self, time_window):
+        """Restricts the graph to the nodes within a time window
+
+        Links between two nodes in the window are kept unchanged. Links crossing one side of
+        the window are kept as truncated stubs which end at a new, invisible node placed on
+        the boundary; each stub gets its own boundary node. Links passing over the whole
+        window are dropped, along with any mutations not plotted within the window.
+
+        Parameters
+        ----------
+        time_window : tuple(float, float)
+            The (t_min, t_max) pair, from _check_time_window()
+
+        Returns
+        -------
+        D3ARG : a new D3ARG with the restricted tables. Nodes and edges gain a boolean
+            "truncated" column marking the stubs.
         """
+        t_min, t_max = time_window
+        node_ids = self.nodes["id"].to_numpy(dtype=np.int64)
+        node_time = self.nodes["time"].to_numpy(dtype=np.float64)
+        in_window = (node_time >= t_min) & (node_time <= t_max)
+        inside = node_ids[in_window]
+        source = self.edges["source"].to_numpy(dtype=np.int64)
+        target = self.edges["target"].to_numpy(dtype=np.int64)
+        source_in = np.isin(source, inside)
+        target_in = np.isin(target, inside)
+        keep = source_in | target_in
+        source, target, source_in, target_in = source[keep], target[keep], source_in[keep], target_in[keep]
+        cut_above = ~source_in
+        cut_below = ~target_in
+        truncated = cut_above | cut_below
+
+        stub_ids = np.max(node_ids, initial=-1) + 1 + np.arange(np.sum(truncated), dtype=np.int64)
+        stub_above = cut_above[truncated]
+        stub_source = source[truncated]
+        stub_target = target[truncated]
+        stubs = {
+            "id": stub_ids,
+            "ts_flags": 0,
+            "time": np.where(stub_above, t_max, t_min),
+            "child_of": [[] if above else [int(s)] for above, s in zip(stub_above, stub_source)],
+            "parent_of": [[int(t)] if above else [] for above, t in zip(stub_above, stub_target)],
+            "size": 0,
+            "symbol": self.default_node_style["symbol"],
+            "fill": self.default_node_style["fill"],
+            "stroke": self.default_node_style["stroke"],
+            "stroke_width": 0,
+            "x_pos_reference": -1,
+            "label": "",
+            "truncated": True,
+        }
+        if "x_pos_01" in self.nodes:
+            stubs["x_pos_01"] = -1
+        nodes = pd.concat(
+            [self.nodes.loc[in_window].assign(truncated=False), pd.DataFrame(stubs)],
+            ignore_index=True,
+        )
+
+        source[cut_above] = stub_ids[stub_above]
+        target[cut_below] = stub_ids[~stub_above]
+        edges = self.edges.loc[keep].reset_index(drop=True)
+        edges["source"] = source
+        edges["target"] = target
+        edges["source_time"] = np.where(cut_above, t_max, edges["source_time"].to_numpy())
+        edges["target_time"] = np.where(cut_below, t_min, edges["target_time"].to_numpy())
+        edges["truncated"] = truncated
+
+        plot_time = self.mutations["plot_time"].to_numpy(dtype=np.float64)
+        mutations = self.mutations.loc[
+            self.mutations["edge"].isin(edges["id"]) & (plot_time >= t_min) & (plot_time <= t_max)
+        ].copy()
+        edge_rows = pd.Index(edges["id"]).get_indexer(mutations["edge"])
+        mutations["source"] = source[edge_rows]
+        mutations["target"] = target[edge_rows]
+
+        in_sample_order = np.isin(np.asarray(self.sample_order, dtype=np.int64), inside)
+        sample_order = [s for s, use in zip(self.sample_order, in_sample_order) if use]
+        return D3ARG(
+            nodes=nodes,
+            edges=edges,
+            mutations=mutations,
+            breakpoints=self.breakpoints,
+            num_samples=len(sample_order),
+            sample_order=sample_order,
+            default_node_style=self.default_node_style,
+            time_units=self.time_units,
+        )
+
+    def _map_node_ids_at_zoom(self, zoom, ids=None):
+        """Maps nodes to the summary nodes that contain them at a zoom level
 
         Parameters
         ----------
         zoom : int
             The level of detail that you want. Larger numbers equate to less detail/more collapsing
+        ids : np.ndarray
+            IDs to map. IDs of nodes that are not in the graph are left as they are.
+            (default=None, the "id" column of the nodes table)
 
         Returns
         -------
-        largest_summary_node : list
-            Ordered list of new node IDs
+        mapped_node_ids : np.ndarray
+            ID of the node, or of the summary node containing it, for each of ids
+        summary_times : dict
+            Time of each summary node in mapped_node_ids, by ID
         """
-
-        branch_lengths = self.edges.loc[:,["source", "target"]].join((self.edges["source_time"] - self.edges["target_time"]).rename("edge_length")).sort_values("edge_length")
-        counter = 0
-        largest_summary_node = list(self.nodes["id"])
-        node_times = {largest_summary_node[i]:t for i,t in enumerate(self.nodes["time"])} # This is bad, fix
-        for edge in branch_lengths.itertuples():
-            if counter >= zoom:
-                break
-            source_flags = self.nodes.loc[self.nodes["id"] == edge.source]["ts_flags"].iloc[0]
-            target_flags = self.nodes.loc[self.nodes["id"] == edge.target]["ts_flags"].iloc[0]
-            if (target_flags & tskit.NODE_IS_SAMPLE) == 0: #and (target_flags != msprime.NODE_IS_RE_EVENT) and (source_flags != msprime.NODE_IS_RE_EVENT):
-                source_i = self.nodes[self.nodes["id"] == edge.source].index[0]
-                target_i = self.nodes[self.nodes["id"] == edge.target].index[0]
-                if largest_summary_node[source_i] != largest_summary_node[target_i]:
-                    indices = [i for i, x in enumerate(largest_summary_node) if (x == largest_summary_node[source_i]) or (x == largest_summary_node[target_i])]
-                    # Surely a better way to do this using numpy but the typing within the array can get tricky
-                    ids_to_remove = []
-                    times = []
-                    for i in indices:
-                        current_id = largest_summary_node[i]
-                        ids_to_remove.append(current_id)
-                        times.append(node_times[current_id])
-                        largest_summary_node[i] = f"S{counter}"
-                    node_times[f"S{counter}"] = sum(times)/len(times)
-                    for i in set(ids_to_remove):
-                        del node_times[i]
-                    counter += 1
-        return largest_summary_node, node_times
+        hierarchy = self.merge_hierarchy
+        if ids is None:
+            ids = self.nodes["id"]
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(hierarchy.node_ids) == 0:
+            return ids, {}
+        pos = np.minimum(np.searchsorted(hierarchy.node_ids, ids), len(hierarchy.node_ids) - 1)
+        found = hierarchy.node_ids[pos] == ids
+        mapped_node_ids = np.where(found, hierarchy.summary_ids(zoom)[pos], ids)
+        used = np.unique(mapped_node_ids[found & (mapped_node_ids >= hierarchy.first_summary_id)])
+        return mapped_node_ids, dict(zip(used.tolist(), hierarchy.times[used - hierarchy.first_summary_id].tolist()))
 
     def _collapse_graph(self, zoom):
         """Collapses the graph to a specified zoom level
 
+        Edges within a summary node are dropped, and parallel edges between the same two
+        (summary) nodes are combined into the first of them: their bounds are joined and
+        their region fractions summed. Mutations follow the edges that they are on.
+
         Parameters
         ----------
         zoom : int
@@ -1403,38 +3067,132 @@ class D3ARG:
         nodes : pd.DataFrame
             Collapsed nodes table including necessary summary nodes
         edges : pd.DataFrame
-            Collapsed nodes table with new source/target IDs
+            Collapsed edges table with new source/target IDs
+        mutations : pd.DataFrame
+            Mutations table with new edge/source/target IDs
         """
-        if zoom > 0:
-            mapped_node_ids, mapped_node_times = self._map_node_ids_at_zoom(zoom=zoom)
-            nodes = []
-            for id in set(mapped_node_ids):
-                if type(id) == int:
-                    nodes.append(self.nodes.loc[self.nodes["id"] == id].to_dict(orient="records")[0])
-                else:
-                    nodes.append({
-                        "id":id,
-                        "ts_flags":99,
-                        "time":mapped_node_times[id],
-                        "child_of":[],
-                        "parent_of":[],
-                        # These don't work as intended, and instead need to be updated with the summary node IDs
-                        "size":150,
-                        "symbol":"d3.symbolCircle",
-                        "fill":"#FFFFFF",
-                        "stroke":"#053e4e",
-                        "stroke_width":4,
-                        "x_pos_reference":-1,
-                        "label":""
-                    })
-            nodes = pd.DataFrame(nodes)
-            edges = self.edges
-            edges = edges.astype(dtype={"source":"object", "target":"object"})
-            for i,node in enumerate(self.nodes["id"]):
-                edges.loc[edges["source"] == node, "source"] = mapped_node_ids[i]
-                edges.loc[edges["target"] == node, "target"] = mapped_node_ids[i]
-            return nodes, edges
-        return self.nodes, self.edges
+        if zoom <= 0:
+            return self.nodes, self.edges, self.mutations
+
+        node_ids = self.nodes["id"].to_numpy(dtype=np.int64)
+        reference = self.nodes["x_pos_reference"].to_numpy(dtype=np.int64)
+        ends = [node_ids, self.edges["source"].to_numpy(dtype=np.int64), self.edges["target"].to_numpy(dtype=np.int64), reference]
+        mapped, summary_times = self._map_node_ids_at_zoom(zoom=zoom, ids=np.concatenate(ends))
+        mapped_node_ids, source, target, reference = np.split(mapped, np.cumsum([len(ids) for ids in ends[:-1]]))
+        summary_nodes = pd.DataFrame(self.default_node_style | {
+            "fill": "#FFFFFF",
+            "id": np.array(list(summary_times), dtype=np.int64),
+            "ts_flags": 0,  # neither a sample nor a recombination node
+            "time": np.array(list(summary_times.values()), dtype=np.float64),
+            "x_pos_reference": -1,
+            "label": "",
+        })
+        for column, value in (("x_pos_01", -1.0), ("truncated", False)):
+            if column in self.nodes:
+                summary_nodes[column] = value  # placed by the simulation, and not a stub
+        unmerged = mapped_node_ids == node_ids
+        nodes = pd.concat([self.nodes.loc[unmerged], summary_nodes], ignore_index=True)
+        nodes["x_pos_reference"] = np.concatenate([reference[unmerged], summary_nodes["x_pos_reference"]])
+
+        rows = np.flatnonzero(source != target)  # edges within a summary node become self-loops
+        span = max(np.max(source, initial=-1), np.max(target, initial=-1)) + 1
+        _, first, link = np.unique(source[rows] * span + target[rows], return_index=True, return_inverse=True)
+        by_first = np.argsort(first, kind="stable")  # keep the links in edges table order
+        rank = np.empty_like(by_first)
+        rank[by_first] = np.arange(len(by_first))
+        link = rank[link.reshape(-1)]
+        kept = rows[first[by_first]]
+        edges = self.edges.iloc[kept].reset_index(drop=True)
+        edges["source"] = source[kept]
+        edges["target"] = target[kept]
+        for end in ("source", "target"):
+            edges[end + "_time"] = edges[end].map(summary_times).fillna(edges[end + "_time"])
+        counts = np.bincount(link, minlength=len(kept))
+        if np.any(counts > 1):
+            parallel = counts[link] > 1
+            bounds = edges["bounds"].to_numpy(dtype=object)
+            joined = pd.Series(self.edges["bounds"].to_numpy(dtype=object)[rows[parallel]]).groupby(link[parallel]).agg(" ".join)
+            bounds[joined.index.to_numpy()] = joined.to_numpy()
+            edges["bounds"] = bounds
+            region_fraction = np.bincount(link, weights=self.edges["region_fraction"].to_numpy()[rows], minlength=len(kept))
+            edges["region_fraction"] = np.minimum(region_fraction, 1.0)
+
+        # Parents and children of every node, now that some of them are summary nodes
+        ids = nodes["id"].to_numpy(dtype=np.int64)
+        order = np.argsort(ids, kind="stable")
+        span = max(span, np.max(ids, initial=-1) + 1)
+        pairs = np.unique(edges["target"].to_numpy() * span + edges["source"].to_numpy())
+        child_of = _group_sorted_pairs(pairs // span, pairs % span, ids[order])[0]
+        pairs = np.unique(edges["source"].to_numpy() * span + edges["target"].to_numpy())
+        parent_of = _group_sorted_pairs(pairs // span, pairs % span, ids[order])[0]
+        position = np.argsort(order).tolist()
+        nodes["child_of"] = [child_of[i] for i in position]
+        nodes["parent_of"] = [parent_of[i] for i in position]
+
+        mutations = self.mutations
+        if len(mutations) > 0:
+            edge_row = pd.Index(self.edges["id"]).get_indexer(mutations["edge"])
+            link_of_edge = np.full(len(self.edges) + 1, -1, dtype=np.int64)  # edge_row -1 is the extra entry
+            link_of_edge[rows] = link
+            mutation_link = link_of_edge[edge_row]
+            keep = (edge_row == -1) | (mutation_link != -1)  # drops the mutations on self-loops
+            mutations = mutations.loc[keep].copy()
+            mutation_link = mutation_link[keep]
+            on_link = mutation_link != -1
+            for column in ("edge", "source", "target"):
+                if column in mutations:
+                    values = mutations[column].to_numpy(copy=True)
+                    values[on_link] = edges["id" if column == "edge" else column].to_numpy()[mutation_link[on_link]]
+                    mutations[column] = values
+        return nodes, edges, mutations
+
+    def _collapse_levels(self, zoom_levels):
+        """Collapses the graph to each of several zoom levels, to switch between in the browser
+
+        Every node and edge is returned once, however many of the levels it is drawn at.
+        As merging only ever makes the graph coarser, these levels are a contiguous range,
+        stored (as positions in zoom_levels) in the "zoom_from" and "zoom_to" columns. The
+        "zoom_into" column of the nodes gives the summary node that a node is merged into
+        at the level after its last one (-1 if it is drawn up to the last level).
+
+        Parameters
+        ----------
+        zoom_levels : list of int
+            Increasing zoom levels (see _collapse_graph)
+
+        Returns
+        -------
+        nodes : pd.DataFrame
+            Nodes and summary nodes drawn at any of the zoom levels
+        edges : pd.DataFrame
+            Edges drawn at any of the zoom levels, an edge whose source, target, bounds or
+            region fraction differ between levels being returned once per version
+        """
+        node_tables, edge_tables, merged_into = [], [], {}
+        previous = None
+        for level, zoom in enumerate(zoom_levels):
+            nodes, edges, _ = self._collapse_graph(zoom=zoom)
+            node_tables.append(nodes.assign(zoom_from=level))
+            edge_tables.append(edges.assign(zoom_from=level))
+            mapped = self._map_node_ids_at_zoom(zoom=zoom)[0]
+            if previous is not None:
+                moved = previous != mapped
+                merged_into.update(zip(previous[moved].tolist(), mapped[moved].tolist()))
+            previous = mapped
+
+        nodes = pd.concat(node_tables, ignore_index=True)
+        last = nodes.groupby("id", sort=False)["zoom_from"].max()
+        nodes = nodes.loc[~nodes["id"].duplicated()].reset_index(drop=True)
+        nodes["zoom_to"] = nodes["id"].map(last).to_numpy()
+        nodes["zoom_into"] = nodes["id"].map(merged_into).fillna(-1).astype(np.int64).to_numpy()
+
+        edges = pd.concat(edge_tables, ignore_index=True)
+        version = pd.util.hash_pandas_object(edges.drop(columns="zoom_from"), index=False)
+        last = edges["zoom_from"].groupby(version.to_numpy(), sort=False).max()
+        first = ~version.duplicated().to_numpy()
+        edges = edges.loc[first].reset_index(drop=True)
+        edges["zoom_to"] = last.loc[version.to_numpy()[first]].to_numpy()
+        return nodes, edges
 
     def draw(
             self,
@@ -1456,9 +3214,15 @@ class D3ARG:
             is_notebook=None,
             rotate_tip_labels=False,
             zoom=0,
+            zoom_levels=None,
             styles=None,
             preamble=None,
             save_filename=None,
+            time_window=None,
+            columnar_data=False,
+            coordinate_precision=None,
+            output_path=None,
+            assets="cdn",
         ):
         """Draws the D3ARG using D3.js by sending a custom JSON object to visualizer.js 
 
@@ -1516,6 +3280,11 @@ class D3ARG:
             Rotates tip labels by 90 degrees. (default=False)
         zoom : int
             The level of detail that you want. Larger numbers equate to less detail/more collapsing
+        zoom_levels : list of int
+            Zoom levels (see zoom) to switch between with a slider in the drawing, without
+            drawing the graph again. The drawing starts at the lowest of them, and only the
+            nodes and edges that differ are swapped when the level changes. Mutations are not
+            shown. Cannot be combined with zoom. (default=None, no slider)
         styles : list
             A list of css strings, one per selector. The ID of the current drawing will be
             appended to each string, so that the styles are unique to the current drawing.
@@ -1533,6 +3302,28 @@ class D3ARG:
         save_filename : str
             Filename to use when selecting "Download as" in the visualization
             (default=None, treated as "tskit_arg_visualizer")
+        time_window : list(float, float)
+            The (t_min, t_max) times to draw, inclusive. Either side can be None to leave it open.
+            Only the nodes, mutations and y-axis tick marks within the window are drawn. Edges
+            crossing the boundary are drawn as dashed stubs ending on it, and edges passing
+            over the whole window are left out. (default=None, all times)
+        columnar_data : bool
+            Whether to embed the nodes, edges, mutations and breakpoints as one array per field,
+            with repeated strings (such as colors) stored once, rather than as one object per row.
+            This makes the output several times smaller for large graphs; the rows are rebuilt
+            in the browser. (default=False)
+        coordinate_precision : int
+            Number of decimal places to round the pixel positions of the nodes, mutations and
+            breakpoints to. (default=None, not rounded)
+        output_path : str or file object
+            File to write the drawing to as a standalone HTML page, rather than displaying it.
+            The page is written piece by piece, so the memory used stays low however large
+            the graph. See also to_html(). (default=None, the drawing is displayed)
+        assets : str
+            Where the drawing gets D3.js from. "cdn" loads it (with require.js) from the internet
+            when the drawing is shown. "inline" embeds the minified copy of D3 shipped with the
+            package, so the drawing works offline and does not wait on the network. D3 is only
+            run once per page, even when several drawings share it. (default="cdn")
 
         Returns
         -------
@@ -1547,14 +3338,40 @@ class D3ARG:
                 print("WARNING: `condense_mutations=True` forces `ignore_mutation_times=True`.")
                 ignore_mutation_times = True
 
-        included_nodes, included_edges = self._collapse_graph(zoom=zoom)
+        if zoom_levels is not None:
+            if any(isinstance(z, bool) or (int(z) != z) or (z < 0) for z in zoom_levels) or (len(zoom_levels) == 0):
+                raise ValueError("zoom_levels must be a list of non-negative integers.")
+            if zoom != 0:
+                raise ValueError("zoom cannot be combined with zoom_levels.")
+            zoom_levels = sorted(set(int(z) for z in zoom_levels))
+            if show_mutations:
+                print("WARNING: `show_mutations=True` is not compatible with `zoom_levels`. Ignoring mutations in current plot.")
+                show_mutations = False
+
+        d3arg = self
+        time_window = _check_time_window(time_window)
+        if time_window is not None:
+            d3arg = self._restrict_to_time_window(time_window)
+            if isinstance(y_axis_labels, (list, dict)):
+                in_window = [t for t in y_axis_labels if time_window[0] <= t <= time_window[1]]
+                if isinstance(y_axis_labels, dict):
+                    y_axis_labels = {t: y_axis_labels[t] for t in in_window}
+                else:
+                    y_axis_labels = in_window
 
-        arg = self._prepare_json(
+        if zoom_levels is None:
+            included_nodes, included_edges, included_mutations = d3arg._collapse_graph(zoom=zoom)
+        else:
+            # Nodes of all the levels share the y-axis, so it does not shift between them
+            included_nodes, included_edges = d3arg._collapse_levels(zoom_levels)
+            included_mutations = d3arg.mutations
+
+        arg = d3arg._prepare_json(
             plot_type="full",
             nodes=included_nodes,
             edges=included_edges,
-            mutations=self.mutations,
-            breakpoints=self.breakpoints,
+            mutations=included_mutations,
+            breakpoints=d3arg.breakpoints,
             width=width,
             height=height,
             tree_highlighting=tree_highlighting,
@@ -1573,11 +3390,41 @@ class D3ARG:
             rotate_tip_labels=rotate_tip_labels,
             preamble=preamble,
             save_filename=save_filename,
+            columnar_data=columnar_data,
+            coordinate_precision=coordinate_precision,
+            as_records=True,
         )
-        info = draw_D3(arg_json=arg, styles=styles, is_notebook=is_notebook)
+        if zoom_levels is not None:
+            arg["data"]["zoom_levels"] = zoom_levels
+            included_nodes = included_nodes.loc[included_nodes["zoom_from"] == 0]
+        info = draw_D3(arg_json=arg, styles=styles, is_notebook=is_notebook, output_path=output_path, assets=assets)
+        if "truncated" in included_nodes:
+            included_nodes = included_nodes.loc[included_nodes["truncated"] != True]  # drop the stub nodes
         info.included.nodes = included_nodes["id"].tolist()
         return info
 
+    def to_html(self, path=None, **kwargs):
+        """Renders the drawing made by draw() as a standalone HTML document, without
+        displaying it, opening a browser or creating a temporary file
+
+        Parameters
+        ----------
+        path : str or file object
+            File to write the document to. (default=None, the document is returned)
+        **kwargs
+            Any of the parameters of draw(), except is_notebook and output_path
+
+        Returns
+        -------
+        html : str
+            The HTML document, or None if it was written to path
+        info : DrawInfo
+            Information about the drawing, as returned by draw()
+        """
+        output = io.StringIO() if path is None else path
+        info = self.draw(output_path=output, **kwargs)
+        return (output.getvalue() if path is None else None), info
+
     def subset_graph(self, seed_nodes, depth):
         """Subsets the graph to focus around a specific node
 
@@ -1605,67 +3452,55 @@ class D3ARG:
 
         if type(seed_nodes) == int:
             seed_nodes = [seed_nodes]
-        for n in seed_nodes:
-            if n not in self.nodes.id.values:
-                raise ValueError(f"Node '{n}' not in the graph.")
+        self.adjacency.positions(seed_nodes)  # raises if a seed is not in the graph
 
         if type(depth) == int:
             depth = [depth]
         older_depth = depth[0]
         younger_depth = depth[-1]
 
-        node_set = set(seed_nodes)
-        first = True
-
-        # Inefficient loop, doesn't acknowledge that some edges could be shared
-        # between focal nodes. These duplicates are dropped eventually, but
-        # a better function would not add them to start.
-        for focal in seed_nodes:
-            
-            above = {focal}
-            below = {focal}
-
-            for od in range(older_depth+1):
-                new_above = set()
-                for n in above:
-                    to_add = self.edges.loc[self.edges["target"] == n, :]
-                    if od == older_depth:
-                        to_add = to_add.loc[to_add["source"].isin(node_set), :]
-                    if first:
-                        included_edges = to_add
-                        first = False
-                    else:
-                        included_edges = pd.concat([included_edges, to_add], ignore_index=True)
-                    new_above.update(to_add["source"])
-                above = new_above
-                node_set.update(new_above)
-
-            for yd in range(younger_depth+1):
-                new_below = set()
-                for n in below:
-                    to_add = self.edges.loc[self.edges["source"] == n, :]
-                    if yd == younger_depth:
-                        to_add = to_add.loc[to_add["target"].isin(node_set), :]
-                    if first:
-                        included_edges = to_add
-                        first = False
-                    else:
-                        included_edges = pd.concat([included_edges, to_add], ignore_index=True)
-                    new_below.update(to_add["target"])
-                below = new_below
-                node_set.update(new_below)
-
-        included_edges = included_edges.drop_duplicates()
+        # Breadth-first search from all the seeds at once, upwards and then downwards. Each
+        # node is expanded once, when it is first reached, so every edge is gathered once.
+        # Edges can name nodes missing from the nodes table (e.g. edited JSON), which are
+        # never expanded.
+        node_ids = self.adjacency.node_ids
+        seeds = np.unique(np.asarray(seed_nodes, dtype=np.int64))
+        ends = {"source": self.edges["source"].to_numpy(dtype=np.int64), "target": self.edges["target"].to_numpy(dtype=np.int64)}
+        reached, rows, frontiers = [seeds], [], []
+        for links, end, max_depth in (
+            (self.adjacency.parent_links, ends["source"], older_depth),
+            (self.adjacency.child_links, ends["target"], younger_depth),
+        ):
+            visited = frontier = seeds
+            for _ in range(max_depth):
+                found = links(frontier)
+                rows.append(found)
+                reached_now = np.setdiff1d(end[found], visited)
+                visited = np.union1d(visited, reached_now)
+                frontier = reached_now[np.isin(reached_now, node_ids)]
+            reached.append(visited)
+            frontiers.append((links, end, frontier))
+        node_set = np.unique(np.concatenate(reached))
+        # Beyond the last level, only the links between nodes already in the subgraph
+        for links, end, frontier in frontiers:
+            found = links(frontier)
+            rows.append(found[np.isin(end[found], node_set)])
+
+        included_edges = self.edges.iloc[np.unique(np.concatenate(rows))].reset_index(drop=True)
         included_nodes = self.nodes.loc[self.nodes["id"].isin(node_set), :]
 
-        ni_child, ni_parent = [], []
-        for n in included_nodes["id"]:
-            all_nodes_parents = self.edges[((self.edges["target"] == n) | (self.edges["source"] == n))]
-            included_nodes_parents = included_edges[((included_edges["target"] == n) | (included_edges["source"] == n))]
-            not_included = pd.merge(all_nodes_parents, included_nodes_parents, indicator=True, how='outer').query('_merge=="left_only"').drop('_merge', axis=1)
-            ni_child.append(sum(not_included["source"] == n))
-            ni_parent.append(sum(not_included["target"] == n))
-        included_nodes = included_nodes.assign(not_included_children=ni_child, not_included_parents=ni_parent)
+        # Links of each node left out of the subgraph: its degree minus its degree within it
+        adjacency = self.adjacency
+        not_included = {}
+        for end, offsets, column in (
+            ("source", adjacency.child_offsets, "not_included_children"),
+            ("target", adjacency.parent_offsets, "not_included_parents"),
+        ):
+            linked = included_edges[end].to_numpy(dtype=np.int64)
+            linked = linked[np.isin(linked, adjacency.node_ids)]
+            included_degree = np.bincount(adjacency.positions(linked), minlength=len(adjacency.node_ids))
+            not_included[column] = (np.diff(offsets) - included_degree)[adjacency.positions(included_nodes["id"])]
+        included_nodes = included_nodes.assign(**not_included)
 
         included_mutations = self.mutations.loc[self.mutations["edge"].isin(included_edges["id"]),:]
 
@@ -1723,6 +3558,10 @@ class D3ARG:
             styles=None,
             preamble=None,
             save_filename=None,
+            columnar_data=False,
+            coordinate_precision=None,
+            output_path=None,
+            assets="cdn",
         ):
         """Draws a subgraph of the D3ARG using D3.js by sending a custom JSON object to visualizer.js.
 
@@ -1789,6 +3628,23 @@ class D3ARG:
         save_filename : str
             Filename to use when selecting "Download as" in the visualization
             (default=None, treated as "tskit_arg_visualizer")
+        columnar_data : bool
+            Whether to embed the nodes, edges, mutations and breakpoints as one array per field,
+            with repeated strings (such as colors) stored once, rather than as one object per row.
+            This makes the output several times smaller for large graphs; the rows are rebuilt
+            in the browser. (default=False)
+        coordinate_precision : int
+            Number of decimal places to round the pixel positions of the nodes, mutations and
+            breakpoints to. (default=None, not rounded)
+        output_path : str or file object
+            File to write the drawing to as a standalone HTML page, rather than displaying it.
+            The page is written piece by piece, so the memory used stays low however large
+            the graph. See also node_to_html(). (default=None, the drawing is displayed)
+        assets : str
+            Where the drawing gets D3.js from. "cdn" loads it (with require.js) from the internet
+            when the drawing is shown. "inline" embeds the minified copy of D3 shipped with the
+            package, so the drawing works offline and does not wait on the network. D3 is only
+            run once per page, even when several drawings share it. (default="cdn")
 
         Returns
         -------
@@ -1824,8 +3680,11 @@ class D3ARG:
             rotate_tip_labels=rotate_tip_labels,
             preamble=preamble,
             save_filename=save_filename,
+            columnar_data=columnar_data,
+            coordinate_precision=coordinate_precision,
+            as_records=True,
         )
-        info = draw_D3(arg_json=arg, styles=styles, is_notebook=is_notebook)
+        info = draw_D3(arg_json=arg, styles=styles, is_notebook=is_notebook, output_path=output_path, assets=assets)
         info.included.nodes = included.nodes["id"].tolist()
         return info
 
@@ -1833,12 +3692,41 @@ class D3ARG:
     # there are multiple focal nodes.
     draw_nodes = draw_node
 
+    def node_to_html(self, seed_nodes, depth=1, path=None, **kwargs):
+        """Renders the drawing made by draw_node() as a standalone HTML document, without
+        displaying it, opening a browser or creating a temporary file
+
+        Parameters
+        ----------
+        seed_nodes : int or list
+            Node ID or list of node IDs that will be central to the subgraph
+        depth : int or list(int, int)
+            Number of nodes above (older than) and below (younger than) the central
+            node to include in the subgraph, as in draw_node() (default=1)
+        path : str or file object
+            File to write the document to. (default=None, the document is returned)
+        **kwargs
+            Any of the other parameters of draw_node(), except is_notebook and output_path
+
+        Returns
+        -------
+        html : str
+            The HTML document, or None if it was written to path
+        info : DrawInfo
+            Information about the drawing, as returned by draw_node()
+        """
+        output = io.StringIO() if path is None else path
+        info = self.draw_node(seed_nodes=seed_nodes, depth=depth, output_path=output, **kwargs)
+        return (output.getvalue() if path is None else None), info
+
     def draw_genome_bar(
             self,
             width=500,
             windows=None,
             show_mutations=False,
             is_notebook=None,
+            output_path=None,
+            assets="cdn",
         ):
         """Draws a genome bar for the D3ARG using D3.js
 
@@ -1857,10 +3745,66 @@ class D3ARG:
             whether it is being called in a notebook environment. This may not work in
             some untested environments, in which case you may wish to set this explicitly
             to True (to force a notebook display) or False (to force a standalone HTML page).
+        output_path : str or file object
+            File to write the genome bar to as a standalone HTML page, rather than displaying
+            it. See also genome_bar_to_html(). (default=None, the genome bar is displayed)
+        assets : str
+            Where the genome bar gets D3.js from. "cdn" loads it from the internet when the
+            genome bar is shown. "inline" embeds the minified copy of D3 shipped with the package,
+            so the genome bar works offline. D3 is only run once per page. (default="cdn")
         """
-        if is_notebook is None:
+        if output_path is not None:
+            is_notebook = False
+        elif is_notebook is None:
             is_notebook = running_in_notebook()
 
+        styles, html, info = self._genome_bar_html(width=width, windows=windows, show_mutations=show_mutations)
+        info.is_notebook = is_notebook
+        scripts = _d3_script(assets)
+        if is_notebook:
+            display(HTML(styles + scripts + html))
+        elif output_path is not None:
+            _write_html_page(output_path, styles + (scripts or _GENOME_BAR_SCRIPTS), [html])
+        else:
+            with tempfile.NamedTemporaryFile("w", encoding="utf-8", delete=False, suffix=".html") as f:
+                url = "file://" + f.name
+                _write_html_page(f, styles + (scripts or _GENOME_BAR_SCRIPTS), [html])
+            webbrowser.open(url, new=2)
+
+    def genome_bar_to_html(self, path=None, width=500, windows=None, show_mutations=False, assets="cdn"):
+        """Renders the genome bar drawn by draw_genome_bar() as a standalone HTML document,
+        without displaying it, opening a browser or creating a temporary file
+
+        Parameters
+        ----------
+        path : str or file object
+            File to write the document to. (default=None, the document is returned)
+        width : int
+            Width of the genome bar in pixels (default=500)
+        windows : list of lists
+            Start and end positions of windows to highlight, as in draw_genome_bar().
+            (Default is None, ignored)
+        show_mutations : bool
+            Whether to add ticks for mutations along the genome bar
+        assets : str
+            Where the genome bar gets D3.js from, "cdn" or "inline", as in draw_genome_bar().
+            (default="cdn")
+
+        Returns
+        -------
+        html : str
+            The HTML document, or None if it was written to path
+        info : DrawInfo
+            Information about the drawing
+        """
+        scripts = _d3_script(assets) or _GENOME_BAR_SCRIPTS
+        styles, html, info = self._genome_bar_html(width=width, windows=windows, show_mutations=show_mutations)
+        output = io.StringIO() if path is None else path
+        _write_html_page(output, styles + scripts, [html])
+        return (output.getvalue() if path is None else None), info
+
+    def _genome_bar_html(self, width, windows, show_mutations):
+        """Returns the <style> element and the HTML of a genome bar, with its DrawInfo"""
         transformed_bps = self.breakpoints.loc[:,:]
         transformed_bps["x_pos"] = transformed_bps["x_pos_01"] * width
         transformed_bps["width"] = transformed_bps["width_01"] * width
@@ -1896,23 +3840,21 @@ class D3ARG:
             "width":width
         }
         
-        genome_bar_json["source"] = genome_bar_json.copy()
+        genome_bar_json = {k: json.dumps(v) for k, v in genome_bar_json.items()}
         genome_bar_json["divnum"] = str(random.randint(0,9999999999))
-        JS_text = Template("<div id='genome_bar_" + genome_bar_json['divnum'] + "'class='d3arg' style='min-width:" + str(genome_bar_json["width"]+40) + "px; min-height:180px;'></div><script>$main_text</script>")
-        breakpointsjs = open(os.path.dirname(__file__) + "/alternative_plots/genome_bar.js", "r")
-        main_text_template = Template(breakpointsjs.read())
-        breakpointsjs.close()
-        main_text = main_text_template.safe_substitute(genome_bar_json)
-        html = JS_text.safe_substitute({'main_text': main_text})
-        css = open(os.path.dirname(__file__) + "/visualizer.css", "r")
-        styles = css.read()
-        css.close()
-        if is_notebook:
-            display(HTML("<style>"+styles+"</style>" + html))
-        else:
-            with tempfile.NamedTemporaryFile("w", delete=False, suffix=".html") as f:
-                url = "file://" + f.name
-                f.write("<!DOCTYPE html><html><head><style>"+styles+"</style><script src='https://cdn.rawgit.com/eligrey/canvas-toBlob.js/f1a01896135ab378aa5c0118eadd81da55e698d8/canvas-toBlob.js'></script><script src='https://cdn.rawgit.com/eligrey/FileSaver.js/e9d941381475b5df8b7d7691013401e171014e89/FileSaver.min.js'></script><script src='https://d3js.org/d3.v7.min.js'></script></head><body>" + html + "</body></html>")
-            webbrowser.open(url, new=2)
+        assets = _get_assets()
+        main_text = _fill_template(assets.genome_bar_js, genome_bar_json)
+        html = (
+            "<div id='genome_bar_" + genome_bar_json['divnum'] + "'class='d3arg' style='min-width:"
+            + str(width+40) + "px; min-height:180px;'></div><script>" + main_text + "</script>"
+        )
+        info = DrawInfo(
+            width=width,
+            height=180,
+            uid="genome_bar_" + genome_bar_json["divnum"],
+            is_notebook=False,
+            included=IncludedObjects(),
+        )
+        return "<style>" + assets.visualizer_css + "</style>", html, info
 
     
@@ -4,22 +4,33 @@ function ensureRequire() {
         return Promise.resolve(require);
     }
 
-    // Otherwise, dynamically load require.js
-    return new Promise((resolve, reject) => {
-        const script = document.createElement('script');
-        script.src = 'https://cdnjs.cloudflare.com/ajax/libs/require.js/2.3.6/require.min.js';
-        script.onload = () => resolve(require);
-        script.onerror = reject;
-        document.head.appendChild(script);
-    });
+    // Otherwise, dynamically load require.js, once per page however many drawings it holds
+    if (typeof globalThis.tskit_arg_visualizer_require === 'undefined') {
+        globalThis.tskit_arg_visualizer_require = new Promise((resolve, reject) => {
+            const script = document.createElement('script');
+            script.src = 'https://cdnjs.cloudflare.com/ajax/libs/require.js/2.3.6/require.min.js';
+            script.onload = () => resolve(require);
+            script.onerror = reject;
+            document.head.appendChild(script);
+        });
+    }
+    return globalThis.tskit_arg_visualizer_require;
 };
 
-ensureRequire()
-    .then(require => {
+function loadD3() {
+    // D3 embedded in the page (assets="inline") is used as is, without require.js
+    if (typeof globalThis.tskit_arg_visualizer_d3 !== 'undefined') {
+        return Promise.resolve(globalThis.tskit_arg_visualizer_d3);
+    }
+    return ensureRequire().then(require => new Promise((resolve, reject) => {
         require.config({ paths: {d3: 'https://d3js.org/d3.v7.min'}});
-        require(["d3"], draw_genome_bar);
-    })
-    .catch(err => console.error('Failed to load require.js:', err));
+        require(["d3"], resolve, reject);
+    }));
+};
+
+loadD3()
+    .then(draw_genome_bar)
+    .catch(err => console.error('Failed to load D3:', err));
 
 
 function draw_genome_bar(d3) {
@@ -10,26 +10,76 @@ function parseRgbString(rgbString) {
   return null; // Or throw an error for invalid format
 }
 
+var NON_FINITE = {"\u0000NaN": NaN, "\u0000Infinity": Infinity, "\u0000-Infinity": -Infinity};
+
+function values_from_column(column, length) {
+    // A column is a plain array, {value} if all values are the same, or {dict, codes}
+    if (Array.isArray(column)) {
+        return column;
+    }
+    if ("value" in column) {
+        return Array(length).fill(column.value);
+    }
+    return column.codes.map(code => column.dict[code]);
+}
+
+function rows_from_columns(table) {
+    // Rebuilds the row objects of a table sent with `columnar_data=True` (see _columns_from_rows)
+    if (Array.isArray(table)) {
+        return table;
+    }
+    const rows = Array.from({length: table.length}, () => ({}));
+    for (const [field, column] of Object.entries(table.columns)) {
+        if (column.rows) {
+            const values = values_from_column(column.values, column.rows.length);
+            column.rows.forEach((row, i) => { rows[row][field] = values[i]; });
+        } else {
+            values_from_column(column, table.length).forEach((value, i) => { rows[i][field] = value; });
+        }
+    }
+    return rows;
+}
+
+function rows_from_columnar_data(data) {
+    for (const name of ["nodes", "links", "mutations", "breakpoints"]) {
+        data[name] = rows_from_columns(data[name]);
+    }
+    return data;
+}
+
 function ensureRequire() {
     // Needed e.g. in Jupyter notebooks: if require is already available, return resolved promise
     if (typeof require !== 'undefined') {
         return Promise.resolve(require);
     }
 
-    // Otherwise, dynamically load require.js
-    return new Promise((resolve, reject) => {
-        const script = document.createElement('script');
-        script.src = 'https://cdnjs.cloudflare.com/ajax/libs/require.js/2.3.6/require.min.js';
-        script.onload = () => resolve(require);
-        script.onerror = reject;
-        document.head.appendChild(script);
-    });
+    // Otherwise, dynamically load require.js, once per page however many drawings it holds
+    if (typeof globalThis.tskit_arg_visualizer_require === 'undefined') {
+        globalThis.tskit_arg_visualizer_require = new Promise((resolve, reject) => {
+            const script = document.createElement('script');
+            script.src = 'https://cdnjs.cloudflare.com/ajax/libs/require.js/2.3.6/require.min.js';
+            script.onload = () => resolve(require);
+            script.onerror = reject;
+            document.head.appendChild(script);
+        });
+    }
+    return globalThis.tskit_arg_visualizer_require;
+};
+
+function loadD3() {
+    // D3 embedded in the page (assets="inline") is used as is, without require.js
+    if (typeof globalThis.tskit_arg_visualizer_d3 !== 'undefined') {
+        return Promise.resolve(globalThis.tskit_arg_visualizer_d3);
+    }
+    return ensureRequire().then(require => new Promise((resolve, reject) => {
+        require.config({ paths: {d3: 'https://d3js.org/d3.v7.min'}});
+        require(["d3"], resolve, reject);
+    }));
 };
 
 function main_visualizer(
     d3,
     divnum,
-    graph,
     width,
     height,
     y_axis,
@@ -41,9 +91,18 @@ function main_visualizer(
     rotate_tip_labels,
     plot_type,
     preamble,
-    source,
     filename_for_saving,
 ) {
+    var source_selector = "#arg_" + String(divnum) + "_source";
+    function read_source() {
+        // NaN and infinities are embedded as strings (see _NON_FINITE_JSON), as JSON has no such numbers
+        var text = d3.select(source_selector).text();
+        if (!text.includes("\\u0000")) {
+            return JSON.parse(text);
+        }
+        return JSON.parse(text, (key, value) => NON_FINITE.hasOwnProperty(value) ? NON_FINITE[value] : value);
+    }
+    var graph = rows_from_columnar_data(read_source().data);
     /*! @source http://purl.eligrey.com/github/FileSaver.js/blob/master/FileSaver.js */
     
     function download (url, name, opts) {
@@ -183,6 +242,16 @@ function main_visualizer(
 
     function draw_force_diagram() {
         var evenly_distributed_positions = graph.evenly_distributed_positions;
+        /* With zoom levels, graph.nodes and graph.links only hold those drawn at the current level */
+        var all_nodes = graph.nodes;
+        var all_links = graph.links;
+        all_links.forEach((d, i) => { d.key = i; }); /* IDs are not unique once links are merged */
+        var node_by_id = new Map(all_nodes.map(d => [d.id, d]));
+        var zoom_levels = graph.zoom_levels;
+        var zoom_level = 0;
+        if (zoom_levels) {
+            set_zoom_level(0);
+        }
         var div_selector = "#arg_" + String(divnum);
         if (preamble) {
             d3.select(div_selector).html(preamble);
@@ -207,8 +276,12 @@ function main_visualizer(
                 d3.selectAll(div_selector + " .node").classed("fix", function(d) {
                     d.fx = d.x;
                 });
-                src = JSON.parse(source);
+                var src = read_source();
+                src.data = rows_from_columnar_data(src.data);
                 src.data.nodes = graph.nodes;
+                if (zoom_levels) {
+                    src.data.links = src.data.links.filter(d => (d.zoom_from <= zoom_level) && (zoom_level <= d.zoom_to));
+                }
                 var textBlob = new Blob([JSON.stringify(src)], {type: "text/plain"});
                 saveAs(textBlob, filename_for_saving + ".json");
             });
@@ -287,17 +360,22 @@ function main_visualizer(
         var labelling_methods = labelling.append("span").attr("class", "tip desc");
         var methods = labelling_methods.append("div").text("Node Labels:").append("div").attr("class", "labelmethods")
         
+        var label_mode = "default";
+
+        function set_label_text(d) {
+            d3.select(this).selectAll("*").remove();
+            if (label_mode == "default") {
+                multi_line_text.call(this, d.label, (d.parent_of.length == 0));
+            } else if (label_mode == "id") {
+                multi_line_text.call(this, "#" + String(d.id));
+            } else {
+                multi_line_text.call(this, "");
+            }
+        }
+
         function switch_node_label(selected) {
-            label_text.each(function(d) {
-                d3.select(this).selectAll("*").remove();
-                if (selected == "default") {
-                    multi_line_text.call(this, d.label, (d.parent_of.length == 0));
-                } else if (selected == "id") {
-                    multi_line_text.call(this, "#" + String(d.id));
-                } else {
-                    multi_line_text.call(this, "");
-                }
-            })
+            label_mode = selected;
+            label_text.each(set_label_text);
         }
         
         methods.append("button").attr("class", "node-labels-default").text("DEFAULT")
@@ -322,6 +400,92 @@ function main_visualizer(
                 d3.select(this).style("text-decoration", "underline");
             });
 
+        if (zoom_levels) {
+            var zooming = dashboard.append("div").attr("class", "zoomlevels");
+            var zoom_text = zooming.append("span").text("Zoom " + zoom_levels[0]);
+            zooming.append("input")
+                .attr("type", "range")
+                .attr("min", 0)
+                .attr("max", zoom_levels.length - 1)
+                .attr("step", 1)
+                .attr("value", 0)
+                .on("input", function() {
+                    zoom_text.text("Zoom " + zoom_levels[this.value]);
+                    show_zoom_level(parseInt(this.value));
+                });
+        }
+
+        function end_id(end) {
+            /* link ends are IDs until the simulation swaps them for the nodes */
+            return (typeof end === "object") ? end.id : end;
+        }
+
+        function set_zoom_level(level) {
+            zoom_level = level;
+            graph.nodes = all_nodes.filter(d => (d.zoom_from <= level) && (level <= d.zoom_to));
+            graph.links = all_links.filter(d => (d.zoom_from <= level) && (level <= d.zoom_to));
+            graph.nodes.forEach(function(d) {
+                d.child_of = [];
+                d.parent_of = [];
+            });
+            graph.links.forEach(function(d) {
+                var source = node_by_id.get(end_id(d.source));
+                var target = node_by_id.get(end_id(d.target));
+                if (!source.parent_of.includes(target.id)) {
+                    source.parent_of.push(target.id);
+                    target.child_of.push(source.id);
+                }
+            });
+            graph.nodes.forEach(function(d) {
+                d.child_of.sort((a, b) => a - b);
+                d.parent_of.sort((a, b) => a - b);
+            });
+        }
+
+        function show_zoom_level(level) {
+            var shown_before = new Set(graph.nodes.map(d => d.id));
+            set_zoom_level(level);
+            var shown_now = new Set(graph.nodes.map(d => d.id));
+            function first_shown(d, shown) {
+                /* the node itself, or the summary node it is merged into, that is in shown */
+                while ((d != null) && !shown.has(d.id)) {
+                    d = node_by_id.get(d.zoom_into);
+                }
+                return d;
+            }
+            /* Nodes split out of a summary node start where it was... */
+            graph.nodes.forEach(function(d) {
+                if (!shown_before.has(d.id)) {
+                    var summary = first_shown(d, shown_before);
+                    if (summary != null) {
+                        d.x = summary.x;
+                        d.vx = 0;
+                    }
+                }
+            });
+            /* ...and a new summary node starts in the middle of the nodes merged into it */
+            var merged = new Map();
+            shown_before.forEach(function(id) {
+                if (!shown_now.has(id)) {
+                    var d = node_by_id.get(id);
+                    var summary = first_shown(d, shown_now);
+                    if ((summary != null) && !shown_before.has(summary.id)) {
+                        var sum = merged.get(summary) || {x: 0, n: 0};
+                        merged.set(summary, {x: sum.x + d.x, n: sum.n + 1});
+                    }
+                }
+            });
+            merged.forEach(function(sum, d) {
+                d.x = sum.x / sum.n;
+                d.vx = 0;
+            });
+            simulation.nodes(graph.nodes);
+            simulation.force("link").links(graph.links);
+            join_links();
+            join_nodes();
+            join_labels();
+            simulation.alpha(0.3).restart();
+        }
 
         var svg = d3.select(div_selector).append("svg")
             .attr("width", width)
@@ -380,121 +544,182 @@ function main_visualizer(
             .force("charge", d3.forceManyBody().strength(-100))
             .on("tick", ticked);
 
-        var link_container = svg
-            .append("g")
-            .attr("class", "links")
-            .selectAll("path")
-            .data(graph.links)
-            .enter()
+        var link_layer = svg
             .append("g")
-            .attr("edge_id", d => d.id) /* this is the ARGviz edge ID, not the tskit edge ID */
-            .attr("bounds", d => d.bounds);
+            .attr("class", "links");
+        var link_container;
 
-        if ((edge_styles.type == "ortho") && edge_styles.include_underlink) {
-            var underlink = link_container
-                .append("path")
-                .attr("class", "underlink");
+        function link_mouseover(event, d) {
+            if (!d3.select(div_selector + ">svg").classed("no-hover")) {
+                d3.select(this)
+                    .style('stroke', '#1eebb1')
+                    .style("cursor", "pointer");
+                d3.selectAll(div_selector + " .sites .e" + d.id).style("display", "block");
+                d3.selectAll(div_selector + " .endpoints")
+                    .style('display', 'none'); /* hide other labels to avoid clashes */
+                const bars = d3.select(div_selector + " .breakpoints").selectAll(".included");
+                bars /* colour in all bars covered by these bounds */
+                    .filter(function(j) {
+                        return d.bounds.split(" ").some(function(region) {
+                            region = region.split("-");
+                            return (parseFloat(region[0]) <= j.start) && (parseFloat(region[1]) >= j.stop)
+                        });
+                    })
+                    .selectAll("rect").style('fill', '#1eebb1');
+                bars /* show the leftmost position label */
+                    .filter(function(j) {
+                        return d.bounds.split(" ").some(function(region) {
+                            region = region.split("-");
+                            return (parseFloat(region[0]) == j.start)
+                        });
+                    })
+                    .selectAll("text.start").style('display', 'block');
+                bars /* show the rightmost position label */
+                    .filter(function(j) {
+                        return d.bounds.split(" ").some(function(region) {
+                            region = region.split("-");
+                            return (parseFloat(region[1]) == j.stop)
+                        });
+                    })
+                    .selectAll("text.stop").style('display', 'block');
+            }
         }
 
-        var link = link_container
-            .append("path")
-            .attr("class", "link")
-            .attr("stroke", d => d.stroke)
-            .attr("stroke-width", "4px");
-        
-        if (edge_styles.variable_width) {
-            link
-                .style("stroke-width", d => d.region_fraction * 7 + 1);
+        function link_mouseout(event, d) {
+            if (!d3.select(div_selector + ">svg").classed("no-hover")) {
+                d3.select(this)
+                    .style('stroke', d.stroke)
+                    .style("cursor", "default");
+                const bars = d3.select(div_selector + " .breakpoints").selectAll(".included");
+                bars.selectAll("rect").style("fill", d.fill);
+                bars.selectAll("text").style("display", "none");
+                d3.selectAll(div_selector + " .endpoints")
+                    .style('display', 'block');
+                d3.selectAll(div_selector + " .sites .e" + d.id).style("display", "none");
+            }
         }
 
-        if (tree_highlighting) {
-            d3.selectAll(div_selector + " .link")
-                .on('mouseover', function (event, d) {
-                    if (!d3.select(div_selector + ">svg").classed("no-hover")) {
-                        d3.select(this)
-                            .style('stroke', '#1eebb1')
-                            .style("cursor", "pointer");
-                        d3.selectAll(div_selector + " .sites .e" + d.id).style("display", "block");
-                        d3.selectAll(div_selector + " .endpoints")
-                            .style('display', 'none'); /* hide other labels to avoid clashes */
-                        const bars = d3.select(div_selector + " .breakpoints").selectAll(".included");
-                        bars /* colour in all bars covered by these bounds */
-                            .filter(function(j) {
-                                return d.bounds.split(" ").some(function(region) {
-                                    region = region.split("-");
-                                    return (parseFloat(region[0]) <= j.start) && (parseFloat(region[1]) >= j.stop)
-                                });
-                            })
-                            .selectAll("rect").style('fill', '#1eebb1');
-                        bars /* show the leftmost position label */
-                            .filter(function(j) {
-                                return d.bounds.split(" ").some(function(region) {
-                                    region = region.split("-");
-                                    return (parseFloat(region[0]) == j.start)
-                                });
-                            })
-                            .selectAll("text.start").style('display', 'block');
-                        bars /* show the rightmost position label */
-                            .filter(function(j) {
-                                return d.bounds.split(" ").some(function(region) {
-                                    region = region.split("-");
-                                    return (parseFloat(region[1]) == j.stop)
-                                });
-                            })
-                            .selectAll("text.stop").style('display', 'block');
-                    }
-                })
-                .on('mouseout', function (event, d) {
-                    if (!d3.select(div_selector + ">svg").classed("no-hover")) {
-                        d3.select(this)
-                            .style('stroke', d.stroke)
-                            .style("cursor", "default");
-                        const bars = d3.select(div_selector + " .breakpoints").selectAll(".included");
-                        bars.selectAll("rect").style("fill", d.fill);
-                        bars.selectAll("text").style("display", "none");
-                        d3.selectAll(div_selector + " .endpoints")
-                            .style('display', 'block');
-                        d3.selectAll(div_selector + " .sites .e" + d.id).style("display", "none");
-                    }
-                });
+        function enter_links(enter) {
+            var group = enter
+                .append("g")
+                .attr("edge_id", d => d.id) /* this is the ARGviz edge ID, not the tskit edge ID */
+                .attr("bounds", d => d.bounds);
+
+            if ((edge_styles.type == "ortho") && edge_styles.include_underlink) {
+                group
+                    .append("path")
+                    .attr("class", "underlink");
+            }
+
+            var path = group
+                .append("path")
+                .attr("class", d => d.truncated ? "link truncated" : "link") /* truncated: stub crossing the time window */
+                .attr("stroke", d => d.stroke)
+                .attr("stroke-width", "4px");
+
+            if (edge_styles.variable_width) {
+                path
+                    .style("stroke-width", d => d.region_fraction * 7 + 1);
+            }
+
+            if (tree_highlighting) {
+                path
+                    .on('mouseover', link_mouseover)
+                    .on('mouseout', link_mouseout);
+            }
+            return group;
         }
 
-        var node_group = svg
-            .append("g")
-            .attr("class", "nodes")
-            .selectAll("circle")
-            .data(graph.nodes)
-            .enter()
-            .append("g");
+        function join_links() {
+            /* keyed, so that changing the zoom level only adds and removes the links that differ */
+            link_container = link_layer
+                .selectChildren("g")
+                .data(graph.links, d => d.key)
+                .join(enter_links);
+        }
 
-        var missing_edges = node_group
-            .filter(d => (d.not_included_parents>0) | (d.not_included_children>0))
-            .append("g")
-            .attr("class", "missing");
+        join_links();
 
-        var missing_parents = missing_edges
-            .filter(d => d.not_included_parents>0)
+        var node_layer = svg
             .append("g")
-            .attr("class", "parents")
-            .append("g");
-        var missing_parents_paths = missing_parents.append("path");
-        var missing_parents_texts = missing_parents
-            .append("text")
-                .attr("class", "label")
-                .style("fill", "gray")
-                .text(d => d.not_included_parents);
+            .attr("class", "nodes");
+        var node_group, node;
+        var missing_parents_paths, missing_parents_texts, missing_children_paths, missing_children_texts;
 
-        var missing_children = missing_edges
-            .filter(d => d.not_included_children>0)
-            .append("g")
-            .attr("class", "children")
-            .append("g");
-        var missing_children_paths = missing_children.append("path");
-        var missing_children_texts = missing_children
-            .append("text")
-                .attr("class", "label")
-                .style("fill", "gray")
-                .text(d => d.not_included_children);
+        function enter_nodes(enter) {
+            var group = enter.append("g");
+
+            var missing_edges = group
+                .filter(d => (d.not_included_parents>0) | (d.not_included_children>0))
+                .append("g")
+                .attr("class", "missing");
+
+            var missing_parents = missing_edges
+                .filter(d => d.not_included_parents>0)
+                .append("g")
+                .attr("class", "parents")
+                .append("g");
+            missing_parents.append("path");
+            missing_parents
+                .append("text")
+                    .attr("class", "label")
+                    .style("fill", "gray")
+                    .text(d => d.not_included_parents);
+
+            var missing_children = missing_edges
+                .filter(d => d.not_included_children>0)
+                .append("g")
+                .attr("class", "children")
+                .append("g");
+            missing_children.append("path");
+            missing_children
+                .append("text")
+                    .attr("class", "label")
+                    .style("fill", "gray")
+                    .text(d => d.not_included_children);
+
+            group
+                .append("path")
+                .attr("transform", d => "translate(" + d.x + "," + d.y + ")")
+                /* d.symbol is a string like "d3.symbolCircle" that we need to evaluate */
+                .attr("d", d3.symbol().type(d => eval(d.symbol)).size(d => d.size))
+                .attr("fill", d => d.fill)
+                .attr("stroke", d => d.stroke)
+                .attr("stroke-width", d => d.stroke_width)
+                /* unique identifier for each node, use svg.node().getElementById (not
+                   document.getElementById) to avoid global ID clashes when finding the node again  */
+                .attr("id", d => "n" + d.id)
+                .attr("class", d => "node n" + d.id + " flag" + d.ts_flags + (d.ts_flags & NODE_IS_SAMPLE ? " sample" : ""))
+                .call(
+                    d3
+                        .drag()
+                        .on("start", dragstarted)
+                        .on("drag", dragged)
+                        .on("end", dragended)
+                )
+                .on('mouseover', function (d, i) {
+                    d3.select(this)
+                        .style("cursor", "pointer")
+                });
+            return group;
+        }
+
+        function join_nodes() {
+            node_group = node_layer
+                .selectChildren("g")
+                .data(graph.nodes, d => d.id)
+                .join(enter_nodes);
+            missing_parents_paths = node_group.select(".parents path");
+            missing_parents_texts = node_group.select(".parents text");
+            missing_children_paths = node_group.select(".children path");
+            missing_children_texts = node_group.select(".children text");
+            node = node_group
+                .select(".node")
+                .attr("parents", d => d.child_of.toString().replace(",", " "))
+                .attr("children", d => d.parent_of.toString().replace(",", " "));
+        }
+
+        join_nodes();
 
         function multi_line_text(text, top_align) {
             if (text != null) {
@@ -513,32 +738,6 @@ function main_visualizer(
                     .attr('dy', (d, i) => ((i === 0) ? initialDy : "1em"));
             }
         }
-        var node = node_group
-            .append("path")
-            .attr("transform", d => "translate(" + d.x + "," + d.y + ")")
-            /* d.symbol is a string like "d3.symbolCircle" that we need to evaluate */
-            .attr("d", d3.symbol().type(d => eval(d.symbol)).size(d => d.size))
-            .attr("fill", d => d.fill)
-            .attr("stroke", d => d.stroke)
-            .attr("stroke-width", d => d.stroke_width)
-            /* unique identifier for each node, use svg.node().getElementById (not
-               document.getElementById) to avoid global ID clashes when finding the node again  */
-            .attr("id", d => "n" + d.id)
-            .attr("class", d => "node n" + d.id + " flag" + d.ts_flags + (d.ts_flags & NODE_IS_SAMPLE ? " sample" : ""))
-            .attr("parents", d => d.child_of.toString().replace(",", " "))
-            .attr("children", d => d.parent_of.toString().replace(",", " "))
-            .call(
-                d3
-                    .drag()
-                    .on("start", dragstarted)
-                    .on("drag", dragged)
-                    .on("end", dragended)
-            )
-            .on('mouseover', function (d, i) {
-                d3.select(this)
-                    .style("cursor", "pointer")
-            });
-
         function highlight_mut(mutation_id, site_id, fill) {
             /* other mutations at the same site on the tree */
             d3.selectAll(div_selector + " .mutations .s" + site_id + " rect").style("stroke", fill);
@@ -667,23 +866,32 @@ function main_visualizer(
             return null
         }
 
-        var label = svg
+        var label_layer = svg
             .append("g")
-            .attr("class", "node-labels")
-            .selectAll("text")
-            .data(graph.nodes)
-            .enter()
-            //.filter(d => d.include_label)
-            .append("g");
+            .attr("class", "node-labels");
+        var label, label_text;
 
-        var label_text = label
-            .attr("class", d => "label n" + d.id)
-            .append("text")
-            .each(function(d) {
-                multi_line_text.call(this, d.label, (d.parent_of.length == 0));
-            })
-            //.each(d => multi_line_text.call(this, d.label, (d.parent_of.length == 0)))
-            .attr("transform", rotate_tip);
+        function enter_labels(enter) {
+            var group = enter
+                //.filter(d => d.include_label)
+                .append("g")
+                .attr("class", d => "label n" + d.id);
+            group
+                .append("text")
+                .each(set_label_text)
+                .attr("transform", rotate_tip);
+            return group;
+        }
+
+        function join_labels() {
+            label = label_layer
+                .selectChildren("g")
+                .data(graph.nodes, d => d.id)
+                .join(enter_labels);
+            label_text = label.select("text");
+        }
+
+        join_labels();
 
         function determine_path_type(d) {
             path_type = ""
@@ -1371,12 +1579,9 @@ function main_visualizer(
     can be used to pass in the appropriate data
 */
 
-ensureRequire()
-    .then(require => {
-        require.config({ paths: {d3: 'https://d3js.org/d3.v7.min'}});
-        require(["d3"], function(d3) {
-            main_visualizer(d3, $divnum, $data, $width, $height, $y_axis, $edges, $condense_mutations, $label_mutations, $tree_highlighting, $title, $rotate_tip_labels, $plot_type, $preamble, $source, $save_filename)
-        });
+loadD3()
+    .then(d3 => {
+        main_visualizer(d3, $divnum, $width, $height, $y_axis, $edges, $condense_mutations, $label_mutations, $tree_highlighting, $title, $rotate_tip_labels, $plot_type, $preamble, $save_filename)
     })
-    .catch(err => console.error('Failed to load require.js:', err));
+    .catch(err => console.error('Failed to load D3:', err));
 